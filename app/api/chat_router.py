@@ -1,30 +1,59 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session as DBSession
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession as DBSession
 from app.schemas.chat import ChatRequest, ChatResponse
 from app.schemas.message import Message, Session
-from typing import List
-from uuid import UUID
+from typing import List, Dict, Any, Optional, Tuple
+from uuid import UUID, uuid4
+import base64
+import json
 
-from app.db.database import get_db
-from app.db.crud import create_session, add_message_to_session, get_session_messages, get_all_sessions, delete_session
-from app.core.main_agent import process_message
+from app.db.database import get_db, AsyncSessionLocal
+from app.db.crud import save_turn, get_session_messages, get_all_sessions, delete_session
+from app.db.write_buffer import write_buffer
+from app.core.main_agent import process_message, stream_message, memory_owner
+from app.core.session_summary import session_summarizer
+from app.core.budget import RequestBudget, BudgetExceeded
+from app.core.memory import chat_history_cache, memory_store
+from langchain_core.messages import HumanMessage, AIMessage
 
 router = APIRouter(prefix="/api", tags=["chat"])
 
+async def _save_turn(db: DBSession, session_id: str, user_content: str, assistant_content: str, new_session: bool):
+    """
+    Persist both messages of a turn, through the group-commit buffer when it is running,
+    then fold older turns into the session's rolling summary in the background.
+    """
+    if write_buffer.running:
+        await write_buffer.add_turn(session_id, user_content, assistant_content, new_session)
+    else:
+        await save_turn(db, session_id, user_content, assistant_content, new_session)
+    chat_history_cache.append(
+        session_id,
+        [HumanMessage(content=user_content), AIMessage(content=assistant_content)],
+        new_session=new_session
+    )
+    session_summarizer.schedule(session_id)
+
 @router.post("/chat", response_model=ChatResponse)
 async def process_chat(request: ChatRequest, db: DBSession = Depends(get_db)):
     """
     Process a chat message and return the agent's response.
     Creates a new session if session_id is not provided.
+    Returns 504 if no answer could be generated within the request budget.
     """
-    session_id = request.session_id
-    if not session_id:
-        session_id = create_session(db)
+    new_session = not request.session_id
+    session_id = request.session_id or str(uuid4())
     
-    # Store user message
-    add_message_to_session(db, session_id, "user", request.message)
-    response, sources = await process_message(request.message, session_id)
-    add_message_to_session(db, session_id, "assistant", response)
+    try:
+        response, sources = await process_message(request.message, session_id, RequestBudget(), request.user_id)
+    except BudgetExceeded:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="The response could not be generated in time, please try again"
+        )
+    # Store the user and assistant messages in one transaction
+    await _save_turn(db, session_id, request.message, response, new_session)
     
     return ChatResponse(
         session_id=session_id,
@@ -32,34 +61,103 @@ async def process_chat(request: ChatRequest, db: DBSession = Depends(get_db)):
         sources=sources
     )
 
+def _sse_event(event: Dict[str, Any]) -> str:
+    """Format an event as a server-sent-event data line."""
+    return f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+@router.post("/chat/stream")
+async def process_chat_stream(request: ChatRequest):
+    """
+    Process a chat message and stream the agent's response as server-sent events.
+    Emits a 'session' event first, 'tool_start'/'tool_end' progress events, 'token' events
+    as the answer is generated and a final 'done' event once the turn is stored.
+    """
+    new_session = not request.session_id
+    session_id = request.session_id or str(uuid4())
+
+    async def event_stream():
+        yield _sse_event({"type": "session", "session_id": session_id})
+        try:
+            async for event in stream_message(request.message, session_id, RequestBudget(), request.user_id):
+                if event["type"] == "done":
+                    # The stream outlives the request scope, so it uses its own session
+                    async with AsyncSessionLocal() as stream_db:
+                        await _save_turn(stream_db, session_id, request.message, event["response"], new_session)
+                yield _sse_event(event)
+        except Exception as e:
+            yield _sse_event({"type": "error", "detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def _encode_cursor(ts_key: str, row_id: Any) -> str:
+    return base64.urlsafe_b64encode(json.dumps([ts_key, row_id]).encode()).decode()
+
+def _decode_cursor(cursor: Optional[str]) -> Optional[Tuple[str, Any]]:
+    if not cursor:
+        return None
+    try:
+        ts_key, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return ts_key, row_id
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
 @router.get("/sessions/{session_id}", response_model=List[Message])
-async def get_session_history(session_id: str, db: DBSession = Depends(get_db)):
+async def get_session_history(
+    session_id: str,
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    before: Optional[str] = None,
+    db: DBSession = Depends(get_db)
+):
     """
-    Retrieve the message history for a specific session.
+    Retrieve the message history for a specific session, latest page first.
+    Older pages are fetched by passing the X-Next-Cursor response header back as `before`.
     """
-    messages = get_session_messages(db, session_id)
-    if not messages:
+    messages = await get_session_messages(db, session_id, limit=limit, before=_decode_cursor(before))
+    if not messages and before is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Session with ID {session_id} not found"
         )
     
+    if len(messages) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = _encode_cursor(messages[0]["ts_key"], messages[0]["id"])
     return messages
 
 @router.get("/sessions", response_model=List[Session])
-async def get_sessions(skip: int = 0, limit: int = 100, db: DBSession = Depends(get_db)):
+async def get_sessions(
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    skip: int = Query(0, ge=0, deprecated=True),
+    db: DBSession = Depends(get_db)
+):
     """
     Retrieve all sessions, sorted by most recent first.
+    The next page is fetched by passing the X-Next-Cursor response header back as `cursor`.
+    `skip` is kept for existing callers and applies as an offset after the cursor.
     """
-    sessions = get_all_sessions(db, skip=skip, limit=limit)
+    sessions = await get_all_sessions(db, limit=limit, after=_decode_cursor(cursor), skip=skip)
+    if len(sessions) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = _encode_cursor(sessions[-1]["ts_key"], sessions[-1]["id"])
     return sessions
 
 @router.delete("/sessions/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def remove_session(session_id: str, db: DBSession = Depends(get_db)):
+async def remove_session(session_id: str, user_id: Optional[str] = None, db: DBSession = Depends(get_db)):
     """
-    Delete a session and all its messages.
+    Delete a session, all its messages and the long-term memories learned in it.
+    Pass the user_id the session was chatted with to purge memories from that user's partition,
+    otherwise they are purged from the shared partition. user_id is not authenticated.
     """
-    success = delete_session(db, session_id)
+    success = await delete_session(db, session_id)
+    chat_history_cache.invalidate(session_id)
+    await memory_store.purge(owner=memory_owner(user_id), session_id=session_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -0,0 +1,31 @@
+from fastapi import APIRouter
+
+from app.utils.embedding_cache import embedding_cache_stats
+from app.core.tools.doc_retriever import query_cache
+from app.utils.tool_cache import tool_cache
+from app.utils.executors import tool_executor, cpu_executor
+from app.core.memory import memory_store
+from app.core.memory_gate import memory_gate
+from app.core.main_agent import memory_agent
+from app.core.context_builder import context_builder
+from app.core.session_summary import session_summarizer
+
+router = APIRouter(prefix="/api", tags=["metrics"])
+
+@router.get("/metrics")
+async def get_metrics():
+    """
+    Return in-process cache and performance counters.
+    """
+    return {
+        "embedding_cache": embedding_cache_stats(),
+        "doc_retriever_query_cache": query_cache.stats(),
+        "tool_cache": tool_cache.stats(),
+        "tool_executor": tool_executor.stats(),
+        "cpu_executor": cpu_executor.stats(),
+        "memory_compaction": memory_store.last_compaction,
+        "memory_gate": memory_gate.stats(),
+        "memory_planner": memory_agent.stats(),
+        "context_builder": context_builder.stats(),
+        "session_summary": session_summarizer.stats(),
+    }
@@ -0,0 +1,90 @@
+import os
+import time
+import asyncio
+from typing import Awaitable, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Wall-clock limit of a whole chat turn
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "45"))
+# Time kept back for the final answer; context gathering must finish before it
+ANSWER_RESERVE = float(os.getenv("ANSWER_RESERVE", "15"))
+# Limits of the individual steps, further capped by what is left of the request budget
+PLANNING_TIMEOUT = float(os.getenv("PLANNING_TIMEOUT", "10"))
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "15"))
+MAX_TOOL_CALLS = int(os.getenv("MAX_TOOL_CALLS", "4"))
+# Limit of post-response work such as memory storing
+BACKGROUND_TIMEOUT = float(os.getenv("BACKGROUND_TIMEOUT", "60"))
+
+
+class BudgetExceeded(asyncio.TimeoutError):
+    """Raised when a step does not finish within the time left in its request budget."""
+
+
+class RequestBudget:
+    """
+    Deadline and limits of one chat turn, passed down to every agent step.
+    Steps run through run(), which bounds them by their own timeout and by what is left of
+    the request, minus a reserve kept for later steps. Steps that are skipped or cut short
+    are recorded in `degraded` so the turn can still be answered with partial context.
+    """
+    def __init__(
+        self,
+        timeout: float = REQUEST_TIMEOUT,
+        answer_reserve: float = ANSWER_RESERVE,
+        max_tool_calls: int = MAX_TOOL_CALLS
+    ):
+        self.started = time.monotonic()
+        self.deadline = self.started + timeout
+        self.answer_reserve = min(answer_reserve, timeout / 2)
+        self.max_tool_calls = max_tool_calls
+        self.degraded: List[str] = []
+
+    def remaining(self, reserve: float = 0.0) -> float:
+        """Seconds left before the deadline, keeping `reserve` seconds for later steps."""
+        return max(self.deadline - time.monotonic() - reserve, 0.0)
+
+    def context_remaining(self) -> float:
+        """Seconds left for memory and tool work before the final answer has to start."""
+        return self.remaining(self.answer_reserve)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def degrade(self, step: str):
+        self.degraded.append(step)
+
+    async def run(self, awaitable: Awaitable[T], step: str, timeout: Optional[float] = None, reserve: float = 0.0) -> T:
+        """
+        Await a step, cancelling it once its timeout or the request deadline (minus reserve) passes.
+
+        Raises:
+            BudgetExceeded: If the step was cancelled for running out of time. Timeouts raised
+                by the step itself propagate unchanged.
+        """
+        limit = self.remaining(reserve)
+        if timeout is not None:
+            limit = min(limit, timeout)
+        if limit <= 0:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            self.degrade(step)
+            raise BudgetExceeded(f"No time left for {step}")
+        # Not wait_for: it raises the same TimeoutError for its own deadline and for timeouts
+        # inside the step (HTTP clients, LLM calls), which must surface as errors of the step
+        task = asyncio.ensure_future(awaitable)
+        try:
+            done, _ = await asyncio.wait({task}, timeout=limit)
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        if not done:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            self.degrade(step)
+            raise BudgetExceeded(f"{step} did not finish within {limit:.1f}s")
+        return task.result()
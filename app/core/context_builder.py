@@ -0,0 +1,170 @@
+import os
+from typing import Any, Dict, List, Optional
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage, ToolMessage
+
+from app.utils.tokens import count_tokens, truncate_to_tokens
+
+# Token budget of the final answer prompt, the answer itself is not included
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "8000"))
+# Tokens always kept for the latest turns; the rolling summary covers every turn older than
+# the ones fitting here, so the optional sections can never push an unsummarized turn out
+CONTEXT_HISTORY_TOKENS = int(os.getenv("CONTEXT_HISTORY_TOKENS", "2500"))
+# Caps of the optional sections, as shares of what is left after the system prompt, the input
+# and the history reserve
+CONTEXT_TOOL_SHARE = float(os.getenv("CONTEXT_TOOL_SHARE", "0.45"))
+CONTEXT_MEMORY_SHARE = float(os.getenv("CONTEXT_MEMORY_SHARE", "0.1"))
+CONTEXT_SUMMARY_SHARE = float(os.getenv("CONTEXT_SUMMARY_SHARE", "0.15"))
+# History passed to the planning calls (memory planner, tool selection)
+PLANNING_HISTORY_TOKENS = int(os.getenv("PLANNING_HISTORY_TOKENS", "1500"))
+# Role markers and separators the chat format adds around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def content_tokens(content: Any) -> int:
+    """Tokens a message with this content takes in a prompt."""
+    return count_tokens(content if isinstance(content, str) else str(content)) + MESSAGE_OVERHEAD_TOKENS
+
+
+def message_tokens(message: BaseMessage) -> int:
+    return content_tokens(message.content)
+
+
+def fitting_count(token_counts: List[int], max_tokens: int) -> int:
+    """How many of the leading items (newest first) fit together in max_tokens."""
+    used = 0
+    for count, tokens in enumerate(token_counts):
+        if used + tokens > max_tokens:
+            return count
+        used += tokens
+    return len(token_counts)
+
+
+def trim_history(history: List[BaseMessage], max_tokens: int) -> List[BaseMessage]:
+    """The longest run of latest messages that fits in max_tokens, in chronological order."""
+    count = fitting_count([message_tokens(message) for message in reversed(history)], max_tokens)
+    return history[len(history) - count:] if count else []
+
+
+class ContextBuilder:
+    """
+    Packs the prompt of the final answer into a token budget.
+    The system prompt and the user's message are always sent, and history_tokens are kept for
+    the latest turns. Tool results, retrieved memories and the session's rolling summary each
+    get a capped share of the rest, with whatever a section does not use going to the recent
+    turns, which are added newest first while they fit.
+    The session summarizer keeps verbatim the latest turns fitting in the same history_tokens
+    and folds everything older into the summary, so a turn is only left out of the prompt
+    once the summary covers it (or, briefly, while the update after the last turn is running).
+    """
+    def __init__(
+        self,
+        token_budget: int = CONTEXT_TOKEN_BUDGET,
+        history_tokens: int = CONTEXT_HISTORY_TOKENS,
+        tool_share: float = CONTEXT_TOOL_SHARE,
+        memory_share: float = CONTEXT_MEMORY_SHARE,
+        summary_share: float = CONTEXT_SUMMARY_SHARE
+    ):
+        self.token_budget = token_budget
+        self.history_tokens = history_tokens
+        self.tool_share = tool_share
+        self.memory_share = memory_share
+        self.summary_share = summary_share
+        self.builds = 0
+        self.total_tokens = 0
+        self.truncated_tool_results = 0
+        self.dropped_memories = 0
+        self.dropped_history_messages = 0
+
+    def _pack_tools(self, tool_messages: List[ToolMessage], max_tokens: int) -> str:
+        """Split the tool budget evenly, smallest results first so their leftover goes to the larger ones."""
+        blocks: Dict[int, str] = {}
+        remaining = max_tokens
+        pending = sorted(range(len(tool_messages)), key=lambda i: count_tokens(str(tool_messages[i].content)))
+        for position, index in enumerate(pending):
+            message = tool_messages[index]
+            share = remaining // (len(pending) - position)
+            header = f"[{message.name}]\n"
+            content = truncate_to_tokens(str(message.content), share - count_tokens(header))
+            if content != str(message.content):
+                self.truncated_tool_results += 1
+            blocks[index] = header + content
+            remaining -= count_tokens(blocks[index])
+        return "\n\n".join(blocks[i] for i in range(len(tool_messages)))
+
+    def _pack_memories(self, title: str, documents: List[str], max_tokens: int) -> str:
+        lines = []
+        used = count_tokens(title)
+        for document in documents:
+            line = f"- {document}"
+            tokens = count_tokens(line) + 1
+            if used + tokens > max_tokens:
+                self.dropped_memories += 1
+                continue
+            lines.append(line)
+            used += tokens
+        return title + "\n" + "\n".join(lines) if lines else ""
+
+    def build(
+        self,
+        system_prompt: str,
+        input_message: str,
+        history: List[BaseMessage],
+        memories: Optional[Dict[str, List[str]]] = None,
+        tool_messages: Optional[List[ToolMessage]] = None,
+        summary: str = ""
+    ) -> List[BaseMessage]:
+        """
+        Assemble the final answer prompt within the token budget.
+
+        Args:
+            system_prompt: Instructions of the main agent, always kept.
+            input_message: The user's message, always kept.
+            history: Recent turns in chronological order, without the input message.
+            memories: Retrieved long-term memories keyed by role ('user' / 'assistant').
+            tool_messages: Results of the tools run for the turn.
+            summary: Rolling summary of the turns older than the recent history.
+        Returns:
+            List[BaseMessage]: A system message, the history that fits and the user's message.
+        """
+        memories = memories or {}
+        tool_messages = tool_messages or []
+        fixed = count_tokens(system_prompt) + count_tokens(input_message) + 2 * MESSAGE_OVERHEAD_TOKENS
+        available = max(self.token_budget - fixed - self.history_tokens, 0)
+
+        sections = []
+        for role, title in (("user", "What you remember about the user:"), ("assistant", "What you remember about yourself:")):
+            if memories.get(role):
+                section = self._pack_memories(title, memories[role], int(available * self.memory_share / 2))
+                if section:
+                    sections.append(section)
+        if tool_messages:
+            sections.append("Tool results:\n" + self._pack_tools(tool_messages, int(available * self.tool_share)))
+        if summary:
+            sections.append(
+                "Summary of the earlier conversation:\n" + truncate_to_tokens(summary, int(available * self.summary_share))
+            )
+
+        system_content = "\n\n".join([system_prompt, *sections])
+        used = count_tokens(system_content) + count_tokens(input_message) + 2 * MESSAGE_OVERHEAD_TOKENS
+        kept_history = trim_history(history, max(self.token_budget - used, self.history_tokens))
+        self.dropped_history_messages += len(history) - len(kept_history)
+        used += sum(message_tokens(message) for message in kept_history)
+
+        self.builds += 1
+        self.total_tokens += used
+        return [SystemMessage(content=system_content), *kept_history, HumanMessage(content=input_message)]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "token_budget": self.token_budget,
+            "history_tokens": self.history_tokens,
+            "builds": self.builds,
+            "avg_tokens": round(self.total_tokens / self.builds, 1) if self.builds else 0.0,
+            "truncated_tool_results": self.truncated_tool_results,
+            "dropped_memories": self.dropped_memories,
+            "dropped_history_messages": self.dropped_history_messages,
+        }
+
+
+context_builder = ContextBuilder()
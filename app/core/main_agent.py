@@ -0,0 +1,336 @@
+import asyncio
+from contextlib import aclosing
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple, Set, Any, Callable, AsyncIterator
+
+from langchain_core.messages import BaseMessage, ToolMessage
+
+from app.core import memory
+from app.core.llm import llm
+from app.core.memory_agent import MemoryAgent
+from app.core.memory_gate import memory_gate
+from app.core.budget import RequestBudget, BudgetExceeded, BACKGROUND_TIMEOUT
+from app.core.context_builder import context_builder, trim_history, PLANNING_HISTORY_TOKENS
+from app.core.session_summary import session_summarizer
+from app.core.tools_agent import ToolsAgent
+from app.core.tools.doc_retriever import extract_citations
+
+SCRIPT_DIR = Path(__file__).parent.resolve()
+with open(SCRIPT_DIR / "system_prompt_collection/main_agent.txt", "r") as f:
+    MAIN_AGENT_SYSTEM_PROMPT = f.read().strip()
+
+memory_agent = MemoryAgent()
+tools_agent = ToolsAgent()
+
+# Keep references to post-response tasks so they are not garbage collected mid-flight
+_background_tasks: Set[asyncio.Task] = set()
+
+
+async def _load_recent_history(session_id: str) -> Tuple[List[BaseMessage], str]:
+    """
+    Load the recent chat history window and the rolling summary of the turns before it.
+    The current user message is stored together with the answer, so it is not in the history yet.
+    The context builder decides how much of the window is sent.
+    """
+    history, summary = await asyncio.gather(
+        asyncio.to_thread(memory.get_recent_chat_history, session_id, session_summarizer.keep_recent),
+        session_summarizer.get(session_id)
+    )
+    return history, summary
+
+
+def memory_owner(user_id: Optional[str] = None) -> Optional[str]:
+    """
+    Owner of the long-term memories of a turn: the user's partition when a user id is given,
+    otherwise None, the shared default partition holding memories stored before partitioning.
+    The user id comes from the client unauthenticated, so it separates users but does not protect them.
+    """
+    return user_id or None
+
+
+def _last_reply(recent_chat_history: List[BaseMessage]) -> Optional[str]:
+    """The assistant's reply to the previous message, if the history ends with one."""
+    if recent_chat_history and recent_chat_history[-1].type == "ai" and isinstance(recent_chat_history[-1].content, str):
+        return recent_chat_history[-1].content
+    return None
+
+
+async def _memory_branch(
+    input_message: str,
+    recent_chat_history: List[BaseMessage],
+    budget: RequestBudget,
+    owner: Optional[str] = None,
+    session_id: Optional[str] = None
+) -> Dict[str, List[str]]:
+    """
+    Plan the turn's memory work in one planner call, store the planned facts in the background,
+    then run the retrievals for every role in one batched call, searching only the owner's memories.
+    The facts come from the input message and from the assistant's previous reply, which ends
+    the history, so each reply is planned by the turn after it.
+
+    Returns:
+        Dict[str, List[str]]: Retrieved documents keyed by role.
+    """
+    need_query, need_store = await asyncio.gather(
+        memory_gate.should_query(input_message),
+        memory_gate.should_store(input_message, _last_reply(recent_chat_history))
+    )
+    if not (need_query or need_store):
+        return {}
+    plan = await memory_agent.plan(input_message, recent_chat_history, budget)
+    facts = plan.facts() if need_store else {}
+    if facts:
+        _schedule_background(_store_facts(facts, owner, session_id))
+    queries = plan.queries() if need_query else {}
+    if not queries:
+        return {}
+
+    results = await budget.run(
+        memory.memory_store.query_many({role: [query] for role, query in queries.items()}, owner=owner),
+        "memory_retrieval", reserve=budget.answer_reserve
+    )
+
+    memories = {}
+    for role, result in results.items():
+        # Chroma returns one list of documents per query text
+        documents = [doc for docs in result for doc in docs]
+        if documents:
+            memories[role] = documents
+    return memories
+
+
+async def _run_tool_with_events(
+    tool_call: Dict[str, Any],
+    budget: RequestBudget,
+    on_event: Optional[Callable[[Dict[str, Any]], None]]
+) -> ToolMessage:
+    if on_event:
+        on_event({"type": "tool_start", "name": tool_call.get("name")})
+    result = await tools_agent.run_tool(tool_call, budget)
+    if on_event:
+        on_event({"type": "tool_end", "name": tool_call.get("name")})
+    return result
+
+
+async def _tools_branch(
+    input_message: str,
+    recent_chat_history: List[BaseMessage],
+    budget: RequestBudget,
+    on_event: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> List[ToolMessage]:
+    """
+    Let the tools agent pick tools and run every tool call from that turn concurrently.
+    Tools that run out of time return a placeholder message, so the others are still used.
+
+    Args:
+        on_event: Optional callback receiving 'tool_start' / 'tool_end' progress events.
+    Returns:
+        List[ToolMessage]: Tool results in the order the calls were requested.
+    """
+    _, tool_calls = await tools_agent.select_tool(input_message, recent_chat_history, budget)
+    if not tool_calls:
+        return []
+    return list(await asyncio.gather(*[_run_tool_with_events(tool_call, budget, on_event) for tool_call in tool_calls]))
+
+
+async def _gather_context(
+    input_message: str,
+    recent_chat_history: List[BaseMessage],
+    budget: RequestBudget,
+    on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+    owner: Optional[str] = None,
+    session_id: Optional[str] = None
+) -> Tuple[Dict[str, List[str]], List[ToolMessage]]:
+    """
+    Run the memory and tools branches concurrently until the context part of the budget is used.
+    A branch that fails or is still running at that point is cancelled and degrades to an empty result.
+    Both planning calls only see the latest turns that fit in PLANNING_HISTORY_TOKENS.
+
+    Returns:
+        Retrieved memories and tool results.
+    """
+    recent_chat_history = trim_history(recent_chat_history, PLANNING_HISTORY_TOKENS)
+    memory_task = asyncio.create_task(_memory_branch(input_message, recent_chat_history, budget, owner, session_id))
+    tools_task = asyncio.create_task(_tools_branch(input_message, recent_chat_history, budget, on_event))
+    try:
+        await asyncio.wait({memory_task, tools_task}, timeout=budget.context_remaining())
+    finally:
+        pending = [task for task in (memory_task, tools_task) if not task.done()]
+        for task in pending:
+            task.cancel()
+        # cancel() only requests it, the branches have to unwind before their state can be read
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    results = []
+    for name, task, empty in (("memory", memory_task, {}), ("tools", tools_task, [])):
+        if task.cancelled():
+            budget.degrade(f"{name}_branch")
+            results.append(empty)
+        elif task.exception() is not None:
+            if not isinstance(task.exception(), BudgetExceeded):
+                print(f"Error in {name} branch: {task.exception()}")
+            results.append(empty)
+        else:
+            results.append(task.result())
+    memories, tool_messages = results
+    return memories, tool_messages
+
+
+def _build_final_messages(
+    input_message: str,
+    recent_chat_history: List[BaseMessage],
+    memories: Dict[str, List[str]],
+    tool_messages: List[ToolMessage],
+    summary: str = ""
+) -> List[BaseMessage]:
+    """
+    Assemble the prompt for the final answer from history, the rolling summary, memories and
+    tool outputs, packed into the context token budget.
+    """
+    return context_builder.build(
+        MAIN_AGENT_SYSTEM_PROMPT, input_message, recent_chat_history,
+        memories=memories, tool_messages=tool_messages, summary=summary
+    )
+
+
+async def _store_facts(facts: Dict[str, List[str]], owner: Optional[str] = None, session_id: Optional[str] = None):
+    """
+    Write planned facts to long-term memory.
+    Runs off the response path, so failures are only logged.
+    """
+    budget = RequestBudget(timeout=BACKGROUND_TIMEOUT, answer_reserve=0)
+    try:
+        await budget.run(memory.memory_store.add_many(facts, owner=owner, session_id=session_id), "memory_store")
+    except Exception as e:
+        print(f"Error storing memory: {e}")
+
+
+def _sources_from_tools(tool_messages: List[ToolMessage]) -> Optional[List[str]]:
+    """Tool names used for the answer; document retrieval is cited by file and page instead."""
+    sources = []
+    for msg in tool_messages:
+        citations = extract_citations(msg.content) if msg.name == "doc_retriever" and isinstance(msg.content, str) else []
+        sources.extend(citations or [msg.name])
+    return list(dict.fromkeys(sources)) or None
+
+
+def _schedule_background(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+def _log_degraded(budget: RequestBudget):
+    if budget.degraded:
+        print(f"Turn degraded after {budget.elapsed():.1f}s, cut short: {', '.join(budget.degraded)}")
+
+
+async def process_message(
+    input_message: str,
+    session_id: str,
+    budget: Optional[RequestBudget] = None,
+    user_id: Optional[str] = None
+) -> Tuple[str, Optional[List[str]]]:
+    """
+    Run the agent pipeline for one user message.
+    Memory planning/retrieval and tool selection/execution run as independent branches,
+    the final answer is generated from both. The planned facts are stored off the response path.
+
+    Args:
+        input_message (str): The input message from the user.
+        session_id (str): The ID of the chat session.
+        budget (Optional[RequestBudget]): Deadline of the turn, a default one is created if omitted.
+        user_id (Optional[str]): Owner of the long-term memories, the shared partition is used if omitted.
+    Returns:
+        Tuple[str, Optional[List[str]]]: The response text and the names of the tools used as sources.
+    Raises:
+        BudgetExceeded: If the final answer could not be generated before the deadline.
+    """
+    budget = budget or RequestBudget()
+    recent_chat_history, summary = await _load_recent_history(session_id)
+    owner = memory_owner(user_id)
+    memory_result, tools_result = await _gather_context(
+        input_message, recent_chat_history, budget, owner=owner, session_id=session_id
+    )
+
+    messages = _build_final_messages(input_message, recent_chat_history, memory_result, tools_result, summary)
+    try:
+        response = await budget.run(llm.ainvoke(messages), "answer")
+    finally:
+        _log_degraded(budget)
+    response_text = response.content
+
+    return response_text, _sources_from_tools(tools_result)
+
+
+async def stream_message(
+    input_message: str,
+    session_id: str,
+    budget: Optional[RequestBudget] = None,
+    user_id: Optional[str] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Streaming variant of process_message.
+    Yields progress events while tools run, then the answer tokens as the LLM produces them.
+    If the deadline passes mid-answer, the tokens produced so far are returned as the response.
+
+    Event types:
+        - {"type": "tool_start", "name": str} / {"type": "tool_end", "name": str}
+        - {"type": "token", "content": str}
+        - {"type": "done", "response": str, "sources": Optional[List[str]]}
+
+    Args:
+        input_message (str): The input message from the user.
+        session_id (str): The ID of the chat session.
+        budget (Optional[RequestBudget]): Deadline of the turn, a default one is created if omitted.
+        user_id (Optional[str]): Owner of the long-term memories, the shared partition is used if omitted.
+    """
+    budget = budget or RequestBudget()
+    recent_chat_history, summary = await _load_recent_history(session_id)
+
+    events: asyncio.Queue = asyncio.Queue()
+    owner = memory_owner(user_id)
+    context_task = asyncio.create_task(_gather_context(
+        input_message, recent_chat_history, budget, events.put_nowait, owner=owner, session_id=session_id
+    ))
+    try:
+        # Forward tool progress events until both branches have finished
+        while True:
+            get_event = asyncio.create_task(events.get())
+            done, _ = await asyncio.wait({get_event, context_task}, return_when=asyncio.FIRST_COMPLETED)
+            if get_event in done:
+                yield get_event.result()
+                continue
+            get_event.cancel()
+            break
+        while not events.empty():
+            yield events.get_nowait()
+        memory_result, tools_result = context_task.result()
+    finally:
+        if not context_task.done():
+            context_task.cancel()
+
+    messages = _build_final_messages(input_message, recent_chat_history, memory_result, tools_result, summary)
+    chunks: List[str] = []
+    try:
+        async with aclosing(llm.astream(messages)) as stream:
+            while True:
+                try:
+                    chunk = await budget.run(anext(stream), "answer")
+                except StopAsyncIteration:
+                    break
+                except BudgetExceeded:
+                    # Keep a partial answer, fail only if nothing was generated
+                    if not chunks:
+                        raise
+                    break
+                if isinstance(chunk.content, str) and chunk.content:
+                    chunks.append(chunk.content)
+                    yield {"type": "token", "content": chunk.content}
+    finally:
+        _log_degraded(budget)
+    response_text = "".join(chunks)
+
+    yield {"type": "done", "response": response_text, "sources": _sources_from_tools(tools_result)}
@@ -1,2 +1,2 @@
-from .memory_for_chat import get_chat_history, get_memory, get_recent_chat_history
-from .user_assisstant_memory import store_user_assistant_memory, retrieve_user_assistant_memory, get_or_create_ua_collection
\ No newline at end of file
+from .memory_for_chat import get_chat_history, get_recent_chat_history, chat_history_cache
+from .user_assisstant_memory import store_user_assistant_memory, retrieve_user_assistant_memory, get_or_create_ua_collection, memory_store, UserAssistantMemoryStore
\ No newline at end of file
@@ -1,40 +1,198 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+from typing import List, Optional, Tuple
+
 import torch
 import numpy as np
 from transformers import AutoTokenizer, AutoModel
 from chromadb.utils import embedding_functions
 
+MODEL_NAME = "keepitreal/vietnamese-sbert"
+
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")  # torch | quantized | onnx
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "")  # empty -> cuda if available, else cpu
+EMBEDDING_NUM_THREADS = int(os.getenv("EMBEDDING_NUM_THREADS", "0"))  # 0 -> torch default
+EMBEDDING_MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "32"))
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+EMBEDDING_MAX_LENGTH = 256
+ONNX_MODEL_PATH = Path("data/onnx/vietnamese-sbert.onnx")
+
+
+class _CLSOutput(torch.nn.Module):
+    """Wrap the transformer so the ONNX graph only outputs last_hidden_state."""
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
 
 class VietnameseSBERTEmbeddingFunction(embedding_functions.EmbeddingFunction):
     """
     Custom embedding function for ChromaDB that uses Vietnamese SBERT model.
+    Concurrent calls are micro-batched by a worker thread: requests arriving within
+    batch_window_ms are merged, sorted by length to limit padding and embedded together.
     """
-    def __init__(self, model=None, tokenizer=None):
+    def __init__(
+        self,
+        model=None,
+        tokenizer=None,
+        backend: str = EMBEDDING_BACKEND,
+        device: str = EMBEDDING_DEVICE,
+        num_threads: int = EMBEDDING_NUM_THREADS,
+        max_batch_size: int = EMBEDDING_MAX_BATCH_SIZE,
+        batch_window_ms: float = EMBEDDING_BATCH_WINDOW_MS
+    ):
         """
         Initialize the embedding function with the Vietnamese SBERT model.
-        
+
         Args:
             model: Optional pre-loaded model instance
             tokenizer: Optional pre-loaded tokenizer instance
+            backend: 'torch', 'quantized' (dynamic int8 on CPU) or 'onnx' (ONNX Runtime on CPU)
+            device: Torch device, defaults to cuda when available
+            num_threads: Number of intra-op CPU threads, 0 keeps the torch default
+            max_batch_size: Maximum number of texts per forward pass
+            batch_window_ms: How long the worker waits to merge concurrent requests
         """
         if model is None or tokenizer is None:
-            self.tokenizer = AutoTokenizer.from_pretrained("keepitreal/vietnamese-sbert")
-            self.model = AutoModel.from_pretrained("keepitreal/vietnamese-sbert")
+            self.tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+            self.model = AutoModel.from_pretrained(MODEL_NAME)
         else:
             self.model = model
             self.tokenizer = tokenizer
-        
+
+        if num_threads > 0:
+            torch.set_num_threads(num_threads)
+
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window_ms / 1000
+        self.backend = backend
+        self.device = torch.device(device or ("cuda" if torch.cuda.is_available() else "cpu"))
+        self.model.eval()
+        self._onnx_session = None
+
+        if backend == "quantized":
+            # Dynamic int8 quantization only targets CPU kernels
+            self.device = torch.device("cpu")
+            self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        elif backend == "onnx":
+            self._onnx_session = self._load_onnx_session()
+            if self._onnx_session is None:
+                self.backend = "torch"
+        self.model.to(self.device)
+
+        self._requests: "queue.Queue[Tuple[List[str], Future]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+
+    def _load_onnx_session(self):
+        try:
+            import onnxruntime
+        except ImportError:
+            print("onnxruntime is not installed, falling back to the torch backend.")
+            return None
+
+        if not ONNX_MODEL_PATH.exists():
+            os.makedirs(ONNX_MODEL_PATH.parent, exist_ok=True)
+            dummy = self.tokenizer(["xin chào"], return_tensors="pt")
+            torch.onnx.export(
+                _CLSOutput(self.model),
+                (dummy["input_ids"], dummy["attention_mask"]),
+                str(ONNX_MODEL_PATH),
+                input_names=["input_ids", "attention_mask"],
+                output_names=["last_hidden_state"],
+                dynamic_axes={
+                    "input_ids": {0: "batch", 1: "sequence"},
+                    "attention_mask": {0: "batch", 1: "sequence"},
+                    "last_hidden_state": {0: "batch", 1: "sequence"},
+                },
+                opset_version=14
+            )
+        return onnxruntime.InferenceSession(str(ONNX_MODEL_PATH), providers=["CPUExecutionProvider"])
+
     def __call__(self, texts):
         """
         Generate embeddings for the given texts.
-        
+
         Args:
             texts: List of text strings to embed
-            
+
         Returns:
             numpy.ndarray: Array of embeddings
         """
-        inputs = self.tokenizer(texts, return_tensors="pt", padding=True, truncation=True, max_length=256)
-        with torch.no_grad():
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.model.config.hidden_size), dtype=np.float32)
+        self._ensure_worker()
+        future: Future = Future()
+        self._requests.put((texts, future))
+        return future.result()
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._worker_loop, name="embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def _worker_loop(self):
+        while True:
+            batch = [self._requests.get()]
+            count = len(batch[0][0])
+            deadline = time.monotonic() + self.batch_window
+            while count < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._requests.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                count += len(request[0])
+
+            texts = [text for request_texts, _ in batch for text in request_texts]
+            try:
+                embeddings = self.embed(texts)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            offset = 0
+            for request_texts, future in batch:
+                future.set_result(embeddings[offset:offset + len(request_texts)])
+                offset += len(request_texts)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts synchronously on the calling thread.
+        Texts are sorted by length and split into sub-batches so each forward pass pads
+        to a similar length; the output keeps the input order.
+        """
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        embeddings = np.empty((len(texts), self.model.config.hidden_size), dtype=np.float32)
+        for start in range(0, len(order), self.max_batch_size):
+            indices = order[start:start + self.max_batch_size]
+            embeddings[indices] = self._forward([texts[i] for i in indices])
+        return embeddings
+
+    def _forward(self, texts: List[str]) -> np.ndarray:
+        if self._onnx_session is not None:
+            inputs = self.tokenizer(texts, return_tensors="np", padding=True, truncation=True, max_length=EMBEDDING_MAX_LENGTH)
+            feed = {i.name: inputs[i.name].astype(np.int64) for i in self._onnx_session.get_inputs()}
+            last_hidden_state = self._onnx_session.run(None, feed)[0]
+            return last_hidden_state[:, 0, :]
+
+        inputs = self.tokenizer(texts, return_tensors="pt", padding=True, truncation=True, max_length=EMBEDDING_MAX_LENGTH)
+        inputs = {name: tensor.to(self.device) for name, tensor in inputs.items()}
+        with torch.inference_mode():
             outputs = self.model(**inputs)
-        embeddings = outputs.last_hidden_state[:, 0, :].cpu().numpy()
-        return embeddings
\ No newline at end of file
+        return outputs.last_hidden_state[:, 0, :].float().cpu().numpy()
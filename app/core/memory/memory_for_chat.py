@@ -1,56 +1,266 @@
+import sys
+import threading
+from collections import OrderedDict, deque
+from typing import List, Dict, Deque, Optional
+
 from langchain_community.chat_message_histories import SQLChatMessageHistory
-from langchain.memory.summary_buffer import ConversationSummaryBufferMemory
 
-from langchain_core.language_models.base import BaseLanguageModel
-from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import AIMessage, HumanMessage, BaseMessage
+
+HISTORY_CACHE_MESSAGES_PER_SESSION = 20
+HISTORY_CACHE_MAX_BYTES = 64 * 1024 * 1024
 
 def get_chat_history(session_id : str):
+    # Imported lazily so importing the memory package does not create the database engines
+    from app.db.database import engine
+
     history = SQLChatMessageHistory(
         table_name='messages',
         session_id=session_id,
-        connection="sqlite:///./data/database.db"
+        connection=engine
     )
 
     return history
 
-def get_memory(llm : BaseLanguageModel, chat_memory : BaseChatMessageHistory):
-    return ConversationSummaryBufferMemory(
-        llm=llm,
-        chat_memory=chat_memory,
-        max_token_limit=500000, 
-    )
+
+class _CachedHistory:
+    def __init__(self, maxlen: int):
+        self.messages: Deque[BaseMessage] = deque(maxlen=maxlen)
+        # True when messages holds the whole session, so a short cache is still authoritative
+        self.complete = False
+        # Rolling summary of the older messages, None until it is loaded
+        self.summary: Optional[str] = None
+        self.size = 0
+
+
+class ChatHistoryCache:
+    """
+    In-process ring buffer of the last messages of each session.
+    Sessions are evicted least-recently-used first once the total size goes over max_bytes.
+    Loads from the database are bracketed by begin_load() and put(): a write to the session in
+    between bumps its generation, and the stale rows are then not cached.
+    The session's rolling summary is kept on the same entry, so a turn served from the cache
+    does not query the database for it either.
+    """
+    def __init__(self, messages_per_session: int = HISTORY_CACHE_MESSAGES_PER_SESSION, max_bytes: int = HISTORY_CACHE_MAX_BYTES):
+        self.messages_per_session = messages_per_session
+        self.max_bytes = max_bytes
+        self._sessions: "OrderedDict[str, _CachedHistory]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        # Loads in flight and write generation per session, only tracked while a load is running
+        self._loading: Dict[str, int] = {}
+        self._generations: Dict[str, int] = {}
+        # Bumped by every summary write, so a summary loaded meanwhile is not cached
+        self._summary_writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.stale_loads = 0
+
+    @staticmethod
+    def _message_size(message: BaseMessage) -> int:
+        return sys.getsizeof(message.content)
+
+    def get(self, session_id: str, number_of_messages: int):
+        """
+        Return the last number_of_messages messages of a session, or None if the cache can't answer.
+        """
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or number_of_messages > self.messages_per_session or \
+                    (len(entry.messages) < number_of_messages and not entry.complete):
+                self.misses += 1
+                return None
+            self._sessions.move_to_end(session_id)
+            self.hits += 1
+            messages = list(entry.messages)
+        return messages[-number_of_messages:] if number_of_messages > 0 else []
+
+    def get_summary(self, session_id: str) -> Optional[str]:
+        """Return the cached summary of a session, or None if it is not cached."""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            return entry.summary if entry is not None else None
+
+    def begin_summary_load(self) -> int:
+        """Start a database load of a summary; returns the token to pass to put_summary()."""
+        with self._lock:
+            return self._summary_writes
+
+    def put_summary(self, session_id: str, summary: str, token: int):
+        """
+        Cache a summary loaded from the database, if the session is cached, has no summary yet,
+        and no summary was written since begin_summary_load() returned token.
+        """
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None or entry.summary is not None or token != self._summary_writes:
+                return
+            self._set_summary(entry, summary)
+            self._evict()
+
+    def set_summary(self, session_id: str, summary: str):
+        """Replace the cached summary of a session after a new one was written to the database."""
+        with self._lock:
+            self._summary_writes += 1
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                self._set_summary(entry, summary)
+                self._evict()
+
+    def _set_summary(self, entry: _CachedHistory, summary: str):
+        size = sys.getsizeof(summary) - (sys.getsizeof(entry.summary) if entry.summary is not None else 0)
+        entry.summary = summary
+        entry.size += size
+        self._size += size
+
+    def ensure_capacity(self, messages_per_session: int):
+        """Grow the ring of every session so it can serve the last messages_per_session messages."""
+        with self._lock:
+            if messages_per_session <= self.messages_per_session:
+                return
+            self.messages_per_session = messages_per_session
+            for entry in self._sessions.values():
+                entry.messages = deque(entry.messages, maxlen=messages_per_session)
+
+    def begin_load(self, session_id: str) -> int:
+        """Register a database load of a session; returns the generation to pass to put()."""
+        with self._lock:
+            self._loading[session_id] = self._loading.get(session_id, 0) + 1
+            return self._generations.setdefault(session_id, 0)
+
+    def end_load(self, session_id: str):
+        """Unregister a load that will not be put, e.g. because the query failed."""
+        with self._lock:
+            self._end_load(session_id)
+
+    def _end_load(self, session_id: str):
+        self._loading[session_id] -= 1
+        if not self._loading[session_id]:
+            del self._loading[session_id]
+            del self._generations[session_id]
+
+    def _written(self, session_id: str):
+        if session_id in self._loading:
+            self._generations[session_id] += 1
+
+    def put(self, session_id: str, messages: List[BaseMessage], complete: bool, generation: int):
+        """
+        Replace the cached history of a session with messages loaded from the database,
+        unless the session was written since begin_load() returned generation.
+        """
+        with self._lock:
+            stale = self._generations.get(session_id) != generation
+            self._end_load(session_id)
+            if stale:
+                self.stale_loads += 1
+                return
+            previous = self._sessions.get(session_id)
+            self._remove(session_id)
+            entry = _CachedHistory(self.messages_per_session)
+            entry.complete = complete
+            self._sessions[session_id] = entry
+            # Summaries are only replaced through set_summary(), so a cached one is still current
+            if previous is not None and previous.summary is not None:
+                self._set_summary(entry, previous.summary)
+            self._extend(entry, messages)
+            self._evict()
+
+    def append(self, session_id: str, messages: List[BaseMessage], new_session: bool = False):
+        """
+        Append newly written messages. Sessions that are not cached are left alone,
+        unless they were just created, in which case the messages are their whole history.
+        """
+        with self._lock:
+            self._written(session_id)
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                if not new_session:
+                    return
+                entry = _CachedHistory(self.messages_per_session)
+                entry.complete = True
+                self._sessions[session_id] = entry
+            self._sessions.move_to_end(session_id)
+            self._extend(entry, messages)
+            self._evict()
+
+    def invalidate(self, session_id: str):
+        with self._lock:
+            self._written(session_id)
+            self._remove(session_id)
+
+    def _extend(self, entry: _CachedHistory, messages: List[BaseMessage]):
+        for message in messages:
+            if len(entry.messages) == entry.messages.maxlen:
+                dropped = entry.messages.popleft()
+                entry.size -= self._message_size(dropped)
+                self._size -= self._message_size(dropped)
+                entry.complete = False
+            entry.messages.append(message)
+            entry.size += self._message_size(message)
+            self._size += self._message_size(message)
+
+    def _remove(self, session_id: str):
+        entry = self._sessions.pop(session_id, None)
+        if entry is not None:
+            self._size -= entry.size
+
+    def _evict(self):
+        while self._size > self.max_bytes and self._sessions:
+            _, entry = self._sessions.popitem(last=False)
+            self._size -= entry.size
+
+
+chat_history_cache = ChatHistoryCache()
+
+
+def _to_base_messages(rows) -> List[BaseMessage]:
+    messages = []
+    for role, content in rows:
+        if role == 'assistant':
+            messages.append(AIMessage(content=content))
+        elif role == 'user':
+            messages.append(HumanMessage(content=content))
+    return messages
+
 
 def get_recent_chat_history(session_id : str, number_of_messages : int = 5):
     """
-    Get recent chat history for a specific session. Query sqlite directly and add message to List[BaseMessage]
+    Get recent chat history for a specific session. Served from the in-process cache when possible,
+    otherwise queried through the shared engine's connection pool.
     Args:
         session_id (str): The ID of the session to retrieve history for.
         number_of_messages (int): The number of recent messages to retrieve.
     Returns:
         List[BaseMessage]: List of recent chat messages as BaseMessage objects.
     """
-    import sqlite3
-    from langchain_core.messages import AIMessage, HumanMessage, BaseMessage
-
-    db_path = './data/database.db'
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    # Giả sử bảng messages có các trường: id, session_id, role, content, created_at
-    query = '''
+    cached = chat_history_cache.get(session_id, number_of_messages)
+    if cached is not None:
+        return cached
+
+    from sqlalchemy import text
+    from app.db.database import engine
+
+    # Load a full ring buffer so the following turns can be served from the cache
+    limit = max(number_of_messages, chat_history_cache.messages_per_session)
+    query = text('''
         SELECT role, content FROM messages
-        WHERE session_id = ?
+        WHERE session_id = :session_id
         ORDER BY timestamp DESC, id DESC
-        LIMIT ?
-    '''
-    cursor.execute(query, (session_id, number_of_messages))
-    rows = cursor.fetchall()
-    conn.close()
+        LIMIT :limit
+    ''')
+    generation = chat_history_cache.begin_load(session_id)
+    try:
+        with engine.connect() as conn:
+            rows = conn.execute(query, {"session_id": session_id, "limit": limit}).fetchall()
+    except Exception:
+        chat_history_cache.end_load(session_id)
+        raise
 
     rows = rows[::-1]
-    messages = []
-    for role, content in rows:
-        if role == 'assistant':
-            messages.append(AIMessage(content=content))
-        elif role == 'user':
-            messages.append(HumanMessage(content=content))
-    return messages
+    messages = _to_base_messages(rows)
+    if limit <= chat_history_cache.messages_per_session:
+        chat_history_cache.put(session_id, messages, complete=len(rows) < limit, generation=generation)
+    else:
+        chat_history_cache.end_load(session_id)
+    return messages[-number_of_messages:] if number_of_messages > 0 else []
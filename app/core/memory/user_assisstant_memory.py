@@ -1,88 +1,452 @@
+import os
+import re
+import time
 import asyncio
-from app.core.memory.embedding import VietnameseSBERTEmbeddingFunction
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.core.memory.embedding import VietnameseSBERTEmbeddingFunction, MODEL_NAME, EMBEDDING_BACKEND
+from app.utils.embedding_cache import get_cached_embedding_function
+from app.utils.resources import get_chroma_client, register_warmup
+from app.utils.executors import run_cpu
 import chromadb
+from chromadb.errors import ChromaError
 import uuid # Import uuid
 
 
-client = chromadb.PersistentClient(path="data/chromadb")
+chroma_path = "data/chromadb"
 
+# Quantized / ONNX backends produce slightly different vectors, so they get their own cache entries.
+# The model itself is only loaded on the first cache miss or during warm-up.
+embedding_function = get_cached_embedding_function(f"{MODEL_NAME}:{EMBEDDING_BACKEND}", VietnameseSBERTEmbeddingFunction)
+register_warmup("memory_embedding", embedding_function.load)
 
-embedding_function = VietnameseSBERTEmbeddingFunction()
+
+# Number of per-owner collection pairs kept resolved in memory
+MEMORY_COLLECTION_CACHE_SIZE = int(os.getenv("MEMORY_COLLECTION_CACHE_SIZE", "256"))
+# Cosine similarity above which a new memory is merged into its nearest neighbor, 0 disables it
+MEMORY_DEDUP_THRESHOLD = float(os.getenv("MEMORY_DEDUP_THRESHOLD", "0.92"))
+# Memories not mentioned again for this many days are dropped by compaction, 0 keeps them forever
+MEMORY_TTL_DAYS = float(os.getenv("MEMORY_TTL_DAYS", "180"))
+# Seconds between background compaction runs, 0 disables the job
+MEMORY_COMPACTION_INTERVAL = float(os.getenv("MEMORY_COMPACTION_INTERVAL", str(6 * 60 * 60)))
+# Neighbors checked per memory when clustering duplicates during compaction
+MEMORY_COMPACTION_NEIGHBORS = 5
+
+_PARTITION_PATTERN = re.compile(r"^(user|assistant)(_[0-9a-f]{24})?$")
+
+
+def _cosine(a: np.ndarray, b: np.ndarray) -> float:
+    norm = float(np.linalg.norm(a) * np.linalg.norm(b))
+    return float(np.dot(a, b) / norm) if norm > 0 else 0.0
+
+
+def partition_name(role: str, owner: Optional[str]) -> str:
+    """
+    Chroma collection holding one owner's memories of a role.
+    Owner ids are hashed, so any id yields a valid collection name; no owner means the shared
+    collections used before memories were partitioned.
+    """
+    if not owner:
+        return role
+    return f"{role}_{hashlib.sha256(owner.encode('utf-8')).hexdigest()[:24]}"
+
+
+class UserAssistantMemoryStore:
+    """
+    Long-term memory of the user and the assistant, partitioned by owner: every owner
+    (a user id) has its own pair of Chroma collections, so a query only searches that owner's
+    memories, and turns without an owner share the default pair that predates partitioning. Records carry owner and session metadata,
+    which lets a session's memories be purged with a `where` filter.
+    Resolved collections are kept in an LRU, and every batched operation embeds all its texts
+    in one call and runs in a single hop to the CPU pool.
+    A new memory that is a near duplicate of its nearest stored neighbor updates that record
+    instead of being added, and compact() periodically merges duplicate clusters and expires
+    memories that were not mentioned for a long time. Duplicates are only merged within a session,
+    so purging a session removes exactly the memories it contributed.
+    """
+    ROLES = ("user", "assistant")
+
+    def __init__(
+        self,
+        path: str = chroma_path,
+        embedding_function=embedding_function,
+        cache_size: int = MEMORY_COLLECTION_CACHE_SIZE,
+        dedup_threshold: float = MEMORY_DEDUP_THRESHOLD,
+        ttl_days: float = MEMORY_TTL_DAYS
+    ):
+        self.path = path
+        self.embedding_function = embedding_function
+        self.cache_size = cache_size
+        self.dedup_threshold = dedup_threshold
+        self.ttl = ttl_days * 24 * 60 * 60
+        self.last_compaction: Optional[Dict[str, Any]] = None
+        self._collections: "OrderedDict[Optional[str], Dict[str, chromadb.Collection]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resolve(self, owner: Optional[str] = None, create: bool = True) -> Optional[Dict[str, chromadb.Collection]]:
+        """
+        Get (or create) the role collections of an owner (blocking).
+        Returns None when create is False and the owner has no memories yet.
+        """
+        with self._lock:
+            collections = self._collections.get(owner)
+            if collections is not None:
+                self._collections.move_to_end(owner)
+                return collections
+
+            client = get_chroma_client(self.path)
+            if create:
+                collections = {
+                    role: client.get_or_create_collection(name=partition_name(role, owner), embedding_function=self.embedding_function)
+                    for role in self.ROLES
+                }
+            else:
+                try:
+                    collections = {
+                        role: client.get_collection(name=partition_name(role, owner), embedding_function=self.embedding_function)
+                        for role in self.ROLES
+                    }
+                except (ValueError, ChromaError):
+                    # Not cached, so memories added later are found by the next lookup
+                    return None
+
+            self._collections[owner] = collections
+            while len(self._collections) > self.cache_size:
+                self._collections.popitem(last=False)
+            return collections
+
+    async def get_collections(self, owner: Optional[str] = None) -> Dict[str, chromadb.Collection]:
+        collections = self._collections.get(owner)
+        if collections is not None:
+            return collections
+        return await asyncio.to_thread(self.resolve, owner)
+
+    def _check_roles(self, roles):
+        for role in roles:
+            if role not in self.ROLES:
+                raise ValueError("Role must be either 'user' or 'assistant'.")
+
+    def _nearest_duplicates(
+        self,
+        collection: chromadb.Collection,
+        embeddings: np.ndarray,
+        session_id: Optional[str]
+    ) -> List[Optional[Tuple[str, Dict[str, Any]]]]:
+        """For every embedding, the id and metadata of the session's nearest stored memory if it is a near duplicate."""
+        if self.dedup_threshold <= 0 or collection.count() == 0:
+            return [None] * len(embeddings)
+        result = collection.query(
+            query_embeddings=embeddings.tolist(), n_results=1, where={"session_id": session_id or ""},
+            include=["embeddings", "metadatas"]
+        )
+        duplicates = []
+        for i, embedding in enumerate(embeddings):
+            if not result["ids"][i]:
+                duplicates.append(None)
+                continue
+            neighbor = np.asarray(result["embeddings"][i][0], dtype=np.float32)
+            if _cosine(embedding, neighbor) >= self.dedup_threshold:
+                duplicates.append((result["ids"][i][0], result["metadatas"][i][0] or {}))
+            else:
+                duplicates.append(None)
+        return duplicates
+
+    def _add_many_sync(self, items: Dict[str, List[str]], owner: Optional[str], session_id: Optional[str]):
+        collections = self.resolve(owner)
+        texts = [text for role in items for text in items[role]]
+        # Chroma's EmbeddingFunction wrapper returns a list of vectors
+        embeddings = np.asarray(self.embedding_function(texts), dtype=np.float32)
+        now = time.time()
+        # Chroma metadata values cannot be None
+        metadata = {"owner": owner or "", "session_id": session_id or "", "created_at": now, "updated_at": now, "mentions": 1}
+        offset = 0
+        for role, role_texts in items.items():
+            collection = collections[role]
+            role_embeddings = embeddings[offset:offset + len(role_texts)]
+            offset += len(role_texts)
+
+            new_records = []
+            new_mentions: Dict[str, int] = {}
+            updates: Dict[str, Tuple[str, np.ndarray, Dict[str, Any]]] = {}
+            for text, embedding, duplicate in zip(role_texts, role_embeddings, self._nearest_duplicates(collection, role_embeddings, session_id)):
+                if duplicate is None:
+                    # Near duplicates within the batch collapse into the first one, with the latest wording
+                    match = next((
+                        i for i, (_, _, other) in enumerate(new_records)
+                        if self.dedup_threshold > 0 and _cosine(embedding, other) >= self.dedup_threshold
+                    ), None)
+                    if match is None:
+                        record_id = str(uuid.uuid4())
+                        new_records.append((record_id, text, embedding))
+                        new_mentions[record_id] = 1
+                    else:
+                        record_id = new_records[match][0]
+                        new_records[match] = (record_id, text, embedding)
+                        new_mentions[record_id] += 1
+                    continue
+                # The latest wording replaces the stored one, the record keeps its origin
+                record_id, record_metadata = duplicate
+                merged = updates[record_id][2] if record_id in updates else dict(record_metadata)
+                merged["updated_at"] = now
+                merged["mentions"] = int(merged.get("mentions", 1)) + 1
+                updates[record_id] = (text, embedding, merged)
+
+            if new_records:
+                collection.add(
+                    ids=[record_id for record_id, _, _ in new_records],
+                    documents=[text for _, text, _ in new_records],
+                    embeddings=[embedding.tolist() for _, _, embedding in new_records],
+                    metadatas=[{**metadata, "mentions": new_mentions[record_id]} for record_id, _, _ in new_records]
+                )
+            if updates:
+                collection.update(
+                    ids=list(updates),
+                    documents=[text for text, _, _ in updates.values()],
+                    embeddings=[embedding.tolist() for _, embedding, _ in updates.values()],
+                    metadatas=[merged for _, _, merged in updates.values()]
+                )
+
+    async def add_many(self, items: Dict[str, List[str]], owner: Optional[str] = None, session_id: Optional[str] = None):
+        """
+        Store texts for several roles at once.
+
+        Args:
+            items (Dict[str, List[str]]): Texts to store keyed by role ('user' / 'assistant').
+            owner (Optional[str]): Partition to store into, the shared collections if omitted.
+            session_id (Optional[str]): Session the memories come from, used to purge them with the session.
+        """
+        items = {role: texts for role, texts in items.items() if texts}
+        self._check_roles(items)
+        if items:
+            await run_cpu(self._add_many_sync, items, owner, session_id)
+
+    def _query_many_sync(self, queries: Dict[str, List[str]], limit: int, owner: Optional[str]) -> Dict[str, List[List[str]]]:
+        collections = self.resolve(owner, create=False)
+        if collections is None:
+            return {role: [[] for _ in role_queries] for role, role_queries in queries.items()}
+        texts = [text for role in queries for text in queries[role]]
+        # Chroma's EmbeddingFunction wrapper returns a list of vectors
+        embeddings = np.asarray(self.embedding_function(texts), dtype=np.float32)
+        results = {}
+        offset = 0
+        for role, role_queries in queries.items():
+            collection = collections[role]
+            count = collection.count()
+            if count == 0:
+                results[role] = [[] for _ in role_queries]
+            else:
+                result = collection.query(
+                    query_embeddings=embeddings[offset:offset + len(role_queries)].tolist(),
+                    n_results=min(limit, count)
+                )
+                results[role] = result['documents']
+            offset += len(role_queries)
+        return results
+
+    async def query_many(self, queries: Dict[str, List[str]], limit: int = 5, owner: Optional[str] = None) -> Dict[str, List[List[str]]]:
+        """
+        Query several roles at once.
+
+        Args:
+            queries (Dict[str, List[str]]): Query texts keyed by role ('user' / 'assistant').
+            limit (int): The maximum number of results per query.
+            owner (Optional[str]): Partition to search, the shared collections if omitted.
+
+        Returns:
+            Dict[str, List[List[str]]]: For each role, one list of documents per query text.
+        """
+        queries = {role: texts for role, texts in queries.items() if texts}
+        self._check_roles(queries)
+        if not queries:
+            return {}
+        return await run_cpu(self._query_many_sync, queries, limit, owner)
+
+    def _purge_sync(self, owner: Optional[str], session_id: Optional[str]):
+        collections = self.resolve(owner, create=False)
+        if collections is None:
+            return
+        if session_id is None and owner:
+            # The whole partition goes away
+            client = get_chroma_client(self.path)
+            with self._lock:
+                self._collections.pop(owner, None)
+                for role in self.ROLES:
+                    client.delete_collection(name=partition_name(role, owner))
+            return
+        for collection in collections.values():
+            collection.delete(where={"session_id": session_id or ""})
+
+    def _compact_collection(self, collection: chromadb.Collection, now: float) -> Dict[str, int]:
+        data = collection.get(include=["embeddings", "metadatas"])
+        ids = data["ids"]
+        report = {"before": len(ids), "after": len(ids), "expired": 0, "merged": 0}
+        if not ids:
+            return report
+        metadatas = {record_id: metadata or {} for record_id, metadata in zip(ids, data["metadatas"])}
+        embeddings = {record_id: np.asarray(embedding, dtype=np.float32) for record_id, embedding in zip(ids, data["embeddings"])}
+
+        expired = set()
+        if self.ttl > 0:
+            # Memories stored before timestamps were recorded are never expired
+            expired = {record_id for record_id, metadata in metadatas.items() if now - float(metadata.get("updated_at", now)) > self.ttl}
+        live = [record_id for record_id in ids if record_id not in expired]
+
+        # Cluster near duplicates with union-find over each memory's nearest neighbors from the index
+        parent = {record_id: record_id for record_id in live}
+        def find(record_id):
+            while parent[record_id] != record_id:
+                parent[record_id] = parent[parent[record_id]]
+                record_id = parent[record_id]
+            return record_id
+
+        n_results = min(MEMORY_COMPACTION_NEIGHBORS + 1, len(ids))
+        if self.dedup_threshold > 0 and len(live) > 1:
+            for start in range(0, len(live), 256):
+                batch = live[start:start + 256]
+                result = collection.query(query_embeddings=[embeddings[record_id].tolist() for record_id in batch], n_results=n_results, include=[])
+                for record_id, neighbors in zip(batch, result["ids"]):
+                    for neighbor in neighbors:
+                        if neighbor == record_id or neighbor not in parent:
+                            continue
+                        # Memories of different sessions are kept apart so each is purged with its session
+                        if metadatas[neighbor].get("session_id", "") != metadatas[record_id].get("session_id", ""):
+                            continue
+                        if _cosine(embeddings[record_id], embeddings[neighbor]) >= self.dedup_threshold:
+                            parent[find(neighbor)] = find(record_id)
+
+        clusters: Dict[str, List[str]] = {}
+        for record_id in live:
+            clusters.setdefault(find(record_id), []).append(record_id)
+
+        removed = list(expired)
+        updates: Dict[str, Dict[str, Any]] = {}
+        for cluster in clusters.values():
+            if len(cluster) < 2:
+                continue
+            # The most recently mentioned memory has the most current wording
+            cluster.sort(key=lambda record_id: float(metadatas[record_id].get("updated_at", 0)), reverse=True)
+            # Union-find chains A~B~C even when A and C differ, so every member is checked against
+            # its group's representative and starts a new group if it is not a duplicate of any
+            groups: Dict[str, List[str]] = {}
+            for record_id in cluster:
+                representative = next((
+                    survivor for survivor in groups
+                    if _cosine(embeddings[survivor], embeddings[record_id]) >= self.dedup_threshold
+                ), None)
+                if representative is None:
+                    groups[record_id] = [record_id]
+                else:
+                    groups[representative].append(record_id)
+
+            for survivor, members in groups.items():
+                if len(members) < 2:
+                    continue
+                merged = dict(metadatas[survivor])
+                merged["mentions"] = sum(int(metadatas[record_id].get("mentions", 1)) for record_id in members)
+                created = [float(metadatas[record_id]["created_at"]) for record_id in members if "created_at" in metadatas[record_id]]
+                if created:
+                    merged["created_at"] = min(created)
+                updates[survivor] = merged
+                removed.extend(members[1:])
+                report["merged"] += len(members) - 1
+
+        if updates:
+            collection.update(ids=list(updates), metadatas=list(updates.values()))
+        for start in range(0, len(removed), 1000):
+            collection.delete(ids=removed[start:start + 1000])
+        report["expired"] = len(expired)
+        report["after"] = collection.count()
+        return report
+
+    def compact(self) -> Dict[str, Any]:
+        """
+        Merge near-duplicate clusters and expire stale memories in every memory collection (blocking).
+
+        Returns:
+            Dict[str, Any]: Record counts before and after, with the number of expired and merged memories.
+        """
+        started = time.monotonic()
+        client = get_chroma_client(self.path)
+        report = {"collections": 0, "before": 0, "after": 0, "expired": 0, "merged": 0}
+        for entry in client.list_collections():
+            # Newer Chroma versions list names, older ones Collection objects
+            name = entry if isinstance(entry, str) else entry.name
+            if not _PARTITION_PATTERN.match(name):
+                continue
+            collection = client.get_collection(name=name, embedding_function=self.embedding_function)
+            collection_report = self._compact_collection(collection, time.time())
+            report["collections"] += 1
+            for key, value in collection_report.items():
+                report[key] += value
+        report["duration_s"] = round(time.monotonic() - started, 2)
+        report["finished_at"] = time.time()
+        self.last_compaction = report
+        return report
+
+    async def compaction_loop(self, interval: float = MEMORY_COMPACTION_INTERVAL):
+        """Run compact() every interval seconds until cancelled; failures are logged and retried next time."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                report = await asyncio.to_thread(self.compact)
+                print(
+                    f"Memory compaction: {report['before']} -> {report['after']} memories in {report['collections']} collections "
+                    f"({report['merged']} merged, {report['expired']} expired, {report['duration_s']}s)"
+                )
+            except Exception as e:
+                print(f"Error compacting memory: {e}")
+
+    async def purge(self, owner: Optional[str] = None, session_id: Optional[str] = None):
+        """
+        Delete memories of a session within an owner's partition, or the owner's whole
+        partition when no session is given.
+        """
+        if owner is None and session_id is None:
+            raise ValueError("An owner or a session id is required to purge memories.")
+        await asyncio.to_thread(self._purge_sync, owner, session_id)
+
+
+memory_store = UserAssistantMemoryStore()
+# The shared collections are opened during warm-up instead of at import, like the other Chroma resources
+register_warmup("memory_collections", memory_store.resolve)
 
 async def get_or_create_ua_collection():
     """
     Get or Create User and Assistant memory collection asynchronously.
-    
+
     Returns:
         tuple[chromadb.Collection, chromadb.Collection]: The user and assistant collections.
     """
-    # Run synchronous chromadb client calls in a separate thread
-    user_collection = await asyncio.to_thread(
-        client.get_or_create_collection,
-        name="user",
-        embedding_function=embedding_function
-    )
-    assistant_collection = await asyncio.to_thread(
-        client.get_or_create_collection,
-        name="assistant",
-        embedding_function=embedding_function
-    )
-    return user_collection, assistant_collection
-
-async def store_user_assistant_memory(role : str, text: str):
+    collections = await memory_store.get_collections()
+    return collections["user"], collections["assistant"]
+
+async def store_user_assistant_memory(role : str, text: str, owner: Optional[str] = None, session_id: Optional[str] = None):
     """
     Store user or assistant memory in the respective collection asynchronously.
-    
+
     Args:
         role (str): The role of the message ('user' or 'assistant').
         text (str): The text to store in the memory.
+        owner (Optional[str]): The owner whose partition the memory belongs to.
+        session_id (Optional[str]): The session the memory comes from.
     """
-    user_collection, assistant_collection = await get_or_create_ua_collection()
-    
-    collection_to_use = None
-    if role == "user":
-        collection_to_use = user_collection
-    elif role == "assistant":
-        collection_to_use = assistant_collection
-    else:
-        raise ValueError("Role must be either 'user' or 'assistant'.")
-
-    if collection_to_use:
-        new_id = str(uuid.uuid4()) # Use uuid for new_id
-        
-        await asyncio.to_thread(
-            collection_to_use.add,
-            documents=[text],
-            ids=[new_id]
-        )
-    
-async def retrieve_user_assistant_memory(role: str, query : str, limit: int = 5):
+    await memory_store.add_many({role: [text]}, owner=owner, session_id=session_id)
+
+async def retrieve_user_assistant_memory(role: str, query : str, limit: int = 5, owner: Optional[str] = None):
     """
     Retrieve user or assistant memory based on a query asynchronously.
-    
+
     Args:
         role (str): The role of the memory to retrieve ('user' or 'assistant').
         query (str): The query to search for in the memory.
         limit (int): The maximum number of results to return.
-        
+        owner (Optional[str]): The owner whose partition is searched.
+
     Returns:
         list: List of retrieved documents.
     """
-    user_collection, assistant_collection = await get_or_create_ua_collection()
-    
-    collection_to_query = None
-    if role == "user":
-        collection_to_query = user_collection
-    elif role == "assistant":
-        collection_to_query = assistant_collection
-    else:
-        raise ValueError("Role must be either 'user' or 'assistant'.")
-
-    if collection_to_query:
-        results = await asyncio.to_thread(
-            collection_to_query.query,
-            query_texts=[query],
-            n_results=limit
-        )
-        return results['documents']
-    return []
\ No newline at end of file
+    results = await memory_store.query_many({role: [query]}, limit=limit, owner=owner)
+    return results.get(role, [])
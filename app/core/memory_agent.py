@@ -1,87 +1,72 @@
-from app.core import memory 
-from app.core.llm import llm
-from typing import List, Dict, Optional
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+from app.core.llm import tools_llm
+from app.core.budget import RequestBudget, BudgetExceeded, PLANNING_TIMEOUT
+from app.schemas.memory import MemoryPlan
+from typing import Any, Dict, List, Optional
+from langchain_core.messages import BaseMessage
 from langchain_core.prompts import ChatPromptTemplate
 from pathlib import Path # Add Path import
 
 SCRIPT_DIR = Path(__file__).parent.resolve()
-with open(SCRIPT_DIR / "system_prompt_collection/decide_store_memory_agent.txt", "r") as f:
-    DECIDE_STORE_SYSTEM_PROMPT = f.read().strip()
+with open(SCRIPT_DIR / "system_prompt_collection/memory_planner.txt", "r") as f:
+    MEMORY_PLANNER_SYSTEM_PROMPT = f.read().strip()
 
-with open(SCRIPT_DIR / "system_prompt_collection/decide_query_memory_agent.txt", "r") as f:
-    DECIDE_QUERY_SYSTEM_PROMPT = f.read().strip()
+# Compiled once; only the message and history change between calls
+MEMORY_PLANNER_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", MEMORY_PLANNER_SYSTEM_PROMPT),
+    ("human", "Recent chat history:\n{history}\n\nLatest user message: {input_message}"),
+])
 
 class MemoryAgent : 
     def __init__(self) : 
-        self.llm = llm
-    
-    async def decide_store(self, recent_chat_history : List[BaseMessage]) -> Optional[Dict[str, str]]:
-        """
-        Decide whether to store information about the user and assistant base on recent chat history
-        If there is no information need to store return None 
-        If there is information need to store return a dict with keys "user" and "assistant" and their corresponding helpful information
-        Arg : 
-            recent_chat_history (List[BaseMessage]): List of recent chat messages as BaseMessage objects.
-        Returns:
-            Optional[Dict[str, str]]: A dictionary with keys "user" and/or "assistant" if there is information to store, otherwise None.
-        """
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", DECIDE_STORE_SYSTEM_PROMPT + "\nChat history :\n{history}"),
-        ])
+        # The low-temperature model keeps the plan deterministic, the schema is enforced by the structured output
+        self.llm = tools_llm
+        self.planner = MEMORY_PLANNER_PROMPT | self.llm.with_structured_output(MemoryPlan)
+        self.plans = 0
+        self.failures = 0
 
-        history_text = "\n".join([
+    @staticmethod
+    def _format_history(recent_chat_history : List[BaseMessage]) -> str:
+        return "\n".join([
             f"User: {msg.content}" if msg.type == 'human' else f"Assistant: {msg.content}" for msg in recent_chat_history
-        ])
-        messages = prompt.format(history=history_text)
-        response = await self.llm.ainvoke(messages)
-        content = response.content.strip()
+        ]) or "(empty)"
 
-        result = {}
-        for line in content.splitlines():
-            if line.lower().startswith('user:'):
-                value = line.split(':',1)[1].strip()
-                if value:
-                    result['user'] = value
-            elif line.lower().startswith('assistant:'):
-                value = line.split(':',1)[1].strip()
-                if value:
-                    result['assistant'] = value
-        if not result:
-            return None
-        return result
-
-    async def decide_query(self, input_message : str, recent_chat_history : List[BaseMessage]) -> Optional[Dict[str,str]]:
+    async def plan(
+        self,
+        input_message : str,
+        recent_chat_history : List[BaseMessage],
+        budget: Optional[RequestBudget] = None
+    ) -> MemoryPlan:
         """
-        Decide what to query from the user and assistant memory based on the input message and recent chat history.
-        If there is no information to query, return None.
+        Plan the memory work of a turn in one call: which memories to query for the input message,
+        and which facts to store from it and from the assistant's previous reply ending the history.
         Args:
             input_message (str): The input message from the user.
             recent_chat_history (List[BaseMessage]): List of recent chat messages as BaseMessage objects.
+            budget (Optional[RequestBudget]): Deadline bounding the LLM call.
         Returns:
-            Optional[str]: A query string if there is information to query in which memory (user/ assistant), otherwise None.
+            MemoryPlan: The validated plan, empty if the model did not return one.
         """
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", DECIDE_QUERY_SYSTEM_PROMPT + "\nInput message: {input_message}\nRecent chat history:\n{history}"),
-        ])
-
-        history_text = "\n".join([
-            f"User: {msg.content}" if msg.type == 'human' else f"Assistant: {msg.content}" for msg in recent_chat_history
-        ])
-        messages = prompt.format(input_message=input_message, history=history_text)
-        response = await self.llm.ainvoke(messages)
-        content = response.content.strip()
+        self.plans += 1
+        call = self.planner.ainvoke({
+            "input_message": input_message,
+            "history": self._format_history(recent_chat_history)
+        })
+        try:
+            if budget is None:
+                plan = await call
+            else:
+                plan = await budget.run(call, "memory_plan", timeout=PLANNING_TIMEOUT, reserve=budget.answer_reserve)
+        except BudgetExceeded:
+            raise
+        except Exception:
+            self.failures += 1
+            raise
+        if plan is None:
+            # Counted rather than silently dropped, so a schema problem shows up in the metrics
+            self.failures += 1
+            print("Memory planner returned no valid plan")
+            return MemoryPlan()
+        return plan
 
-        result = {}
-        for line in content.splitlines():
-            if line.lower().startswith('user:'):
-                value = line.split(':',1)[1].strip()
-                if value:
-                    result['user'] = value
-            elif line.lower().startswith('assistant:'):
-                value = line.split(':',1)[1].strip()
-                if value:
-                    result['assistant'] = value
-        if not result:
-            return None
-        return result
\ No newline at end of file
+    def stats(self) -> Dict[str, Any]:
+        return {"plans": self.plans, "invalid_plans": self.failures}
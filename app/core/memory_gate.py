@@ -0,0 +1,193 @@
+import os
+import re
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from app.core.memory.user_assisstant_memory import embedding_function
+from app.utils.executors import run_cpu
+from app.utils.resources import register_warmup
+
+MEMORY_GATE_ENABLED = os.getenv("MEMORY_GATE_ENABLED", "true").lower() in ("1", "true", "yes")
+# Similarity to the closest "needs memory" prototype at which the LLM call is always made
+MEMORY_GATE_QUERY_THRESHOLD = float(os.getenv("MEMORY_GATE_QUERY_THRESHOLD", "0.55"))
+MEMORY_GATE_STORE_THRESHOLD = float(os.getenv("MEMORY_GATE_STORE_THRESHOLD", "0.6"))
+# Below the threshold, the call is still made unless the closest "no memory" prototype wins by this margin
+MEMORY_GATE_MARGIN = float(os.getenv("MEMORY_GATE_MARGIN", "0.05"))
+
+# Short acknowledgements and greetings never need memory work
+_SMALL_TALK = re.compile(
+    r"^\W*(ok(ay)?|thanks?( you)?|thank u|thx|cool|great|nice|yes|no|yeah|yep|nope|sure|hi|hello|hey|bye|goodbye|"
+    r"cảm ơn|cám ơn|ok bạn|vâng|dạ|ừ|uh|chào|xin chào|tạm biệt|được|tốt|hay quá)\W*$",
+    re.IGNORECASE
+)
+# Messages referring to the user, the assistant or earlier conversations may need stored memories
+_QUERY_CUES = re.compile(
+    r"\b(my|mine|remember|recall|last time|you said|you told|about me|"
+    r"của tôi|của mình|nhớ|lần trước|hôm trước|bạn đã nói)\b",
+    re.IGNORECASE
+)
+# Self-disclosure and explicit requests to remember are worth storing
+_STORE_CUES = re.compile(
+    r"\b(my name|i am|i'm|i work|i live|i like|i love|i hate|i prefer|i don't like|my favorite|remember that|call me|"
+    r"tên tôi|tên mình|tôi là|mình là|tôi thích|mình thích|tôi ghét|tôi sống|tôi làm|hãy nhớ|nhớ giúp|gọi tôi là)\b",
+    re.IGNORECASE
+)
+# Replies in which the assistant takes on a name, role or promise
+_ASSISTANT_STORE_CUES = re.compile(
+    r"\b(i will remember|i'll remember|i promise|from now on|call me|my name is|"
+    r"tôi sẽ nhớ|mình sẽ nhớ|tôi hứa|từ giờ|từ nay|gọi tôi là|tên tôi là)\b",
+    re.IGNORECASE
+)
+
+QUERY_PROTOTYPES = {
+    "need": [
+        "What is my name?",
+        "Do you remember what I told you about my job?",
+        "Recommend something based on what I like.",
+        "What did we talk about last time?",
+        "Bạn có nhớ tên tôi không?",
+        "Gợi ý cho tôi dựa trên sở thích của tôi.",
+        "Lần trước chúng ta đã nói về chuyện gì?",
+    ],
+    "skip": [
+        "What is the weather in Hanoi today?",
+        "Search the web for the latest news about AI.",
+        "Explain how a hash table works.",
+        "Translate this sentence into English.",
+        "Thời tiết hôm nay thế nào?",
+        "Giải thích thuật toán sắp xếp nhanh.",
+        "Tìm tin tức mới nhất về bóng đá.",
+    ],
+}
+
+STORE_PROTOTYPES = {
+    "need": [
+        "My name is Minh and I am a software engineer.",
+        "I live in Da Nang and work at a bank.",
+        "I really like Python and hate Java.",
+        "Please remember that my birthday is in May.",
+        "Tên tôi là Lan, tôi là sinh viên.",
+        "Tôi thích đọc sách và nghe nhạc.",
+        "Hãy nhớ rằng tôi bị dị ứng hải sản.",
+    ],
+    "skip": [
+        "What is the weather in Hanoi today?",
+        "Can you explain that again?",
+        "How do I sort a list in Python?",
+        "Thanks, that helps.",
+        "Thời tiết hôm nay thế nào?",
+        "Giải thích lại giúp tôi được không?",
+        "Cảm ơn bạn nhiều.",
+    ],
+}
+
+
+class MemoryGate:
+    """
+    Local pre-classifier deciding whether the MemoryAgent planning calls are worth making.
+    Cheap rules decide the obvious cases (small talk, explicit self-disclosure); everything
+    else is compared with labeled prototype messages using the memory embedding model.
+    The gate fails open: when in doubt, or if classification errors, the LLM call is made.
+    """
+    def __init__(
+        self,
+        query_threshold: float = MEMORY_GATE_QUERY_THRESHOLD,
+        store_threshold: float = MEMORY_GATE_STORE_THRESHOLD,
+        margin: float = MEMORY_GATE_MARGIN,
+        enabled: bool = MEMORY_GATE_ENABLED
+    ):
+        self.thresholds = {"query": query_threshold, "store": store_threshold}
+        self.margin = margin
+        self.enabled = enabled
+        self._prototypes: Optional[Dict[str, Dict[str, np.ndarray]]] = None
+        self._lock = threading.Lock()
+        self.counters: Dict[str, Dict[str, int]] = {
+            kind: {"checked": 0, "skipped": 0, "rule_skip": 0, "rule_need": 0, "prototype_skip": 0, "prototype_need": 0, "errors": 0}
+            for kind in ("query", "store")
+        }
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1.0)
+
+    def _get_prototypes(self) -> Dict[str, Dict[str, np.ndarray]]:
+        if self._prototypes is None:
+            with self._lock:
+                if self._prototypes is None:
+                    self._prototypes = {
+                        kind: {label: self._normalize(embedding_function(texts)) for label, texts in prototypes.items()}
+                        for kind, prototypes in (("query", QUERY_PROTOTYPES), ("store", STORE_PROTOTYPES))
+                    }
+        return self._prototypes
+
+    def _classify(self, kind: str, text: str) -> Tuple[bool, str]:
+        """Return (needed, reason) for one kind of memory work (blocking)."""
+        if _SMALL_TALK.match(text):
+            return False, "rule_skip"
+        cues = _QUERY_CUES if kind == "query" else _STORE_CUES
+        if cues.search(text):
+            return True, "rule_need"
+
+        prototypes = self._get_prototypes()[kind]
+        vector = self._normalize(embedding_function([text]))[0]
+        need = float(np.max(prototypes["need"] @ vector))
+        skip = float(np.max(prototypes["skip"] @ vector))
+        if need >= self.thresholds[kind] or skip - need < self.margin:
+            return True, "prototype_need"
+        return False, "prototype_skip"
+
+    async def _decide(self, kind: str, text: str) -> bool:
+        if not self.enabled:
+            return True
+        counters = self.counters[kind]
+        counters["checked"] += 1
+        try:
+            needed, reason = await run_cpu(self._classify, kind, text.strip())
+        except Exception as e:
+            print(f"Error in memory gate: {e}")
+            counters["errors"] += 1
+            return True
+        counters[reason] += 1
+        if not needed:
+            counters["skipped"] += 1
+        return needed
+
+    async def should_query(self, input_message: str) -> bool:
+        """Whether the turn's message may need long-term memories."""
+        return await self._decide("query", input_message)
+
+    async def should_store(self, input_message: str, last_reply: Optional[str] = None) -> bool:
+        """
+        Whether the user's message or the assistant's reply before it may contain something worth
+        remembering: the message is classified as usual, the reply only by rules, since the
+        prototypes describe user messages.
+        """
+        if self.enabled and last_reply and _ASSISTANT_STORE_CUES.search(last_reply):
+            counters = self.counters["store"]
+            counters["checked"] += 1
+            counters["rule_need"] += 1
+            return True
+        return await self._decide("store", input_message)
+
+    def warm_up(self):
+        self._get_prototypes()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            **{
+                kind: {
+                    **counters,
+                    "skip_rate": round(counters["skipped"] / counters["checked"], 4) if counters["checked"] else 0.0
+                }
+                for kind, counters in self.counters.items()
+            }
+        }
+
+
+memory_gate = MemoryGate()
+register_warmup("memory_gate", memory_gate.warm_up)
@@ -0,0 +1,188 @@
+import os
+import asyncio
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+
+from app.core.llm import tools_llm
+from app.core.budget import RequestBudget, BACKGROUND_TIMEOUT
+from app.core.context_builder import CONTEXT_HISTORY_TOKENS, content_tokens, fitting_count
+from app.core.memory.memory_for_chat import HISTORY_CACHE_MESSAGES_PER_SESSION, chat_history_cache
+from app.db.database import AsyncSessionLocal
+from app.db.crud import get_session_summary, get_latest_messages, get_messages_between, save_session_summary
+from app.utils.tokens import truncate_to_tokens
+
+SUMMARY_ENABLED = os.getenv("SUMMARY_ENABLED", "true").lower() in ("1", "true", "yes")
+# Most messages loaded as recent history; older ones are always folded into the summary
+SUMMARY_KEEP_RECENT = int(os.getenv("SUMMARY_KEEP_RECENT", str(HISTORY_CACHE_MESSAGES_PER_SESSION)))
+# An update folds messages until the verbatim window is down to this share of its token and
+# message limits, so the next update is only needed after a few more turns
+SUMMARY_FOLD_SHARE = float(os.getenv("SUMMARY_FOLD_SHARE", "0.5"))
+SUMMARY_MAX_BATCH = int(os.getenv("SUMMARY_MAX_BATCH", "40"))
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "600"))
+# Long answers are cut before folding, the summary only needs their gist
+SUMMARY_MESSAGE_MAX_TOKENS = int(os.getenv("SUMMARY_MESSAGE_MAX_TOKENS", "400"))
+
+SCRIPT_DIR = Path(__file__).parent.resolve()
+with open(SCRIPT_DIR / "system_prompt_collection/session_summary.txt", "r") as f:
+    SESSION_SUMMARY_SYSTEM_PROMPT = f.read().strip()
+
+SESSION_SUMMARY_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", SESSION_SUMMARY_SYSTEM_PROMPT),
+    ("human", "Current summary:\n{summary}\n\nNew messages:\n{messages}"),
+])
+
+
+class SessionSummarizer:
+    """
+    Rolling per-session summary of the messages that fell out of the recent history window.
+    The window is the latest messages fitting in the context builder's history reserve (at most
+    keep_recent of them), which the final prompt always has room for, so every message is either
+    sent verbatim or covered by the summary. Once an unsummarized message is outside the window,
+    an update folds messages until the window is down to fold_share of its limits.
+    The summary is stored in the database together with the id of the last message it covers,
+    and each update folds only the messages after that id into the previous summary, so it is
+    never recomputed from the whole session. Updates run in the background after a turn is stored.
+    """
+    def __init__(
+        self,
+        keep_recent: int = SUMMARY_KEEP_RECENT,
+        window_tokens: int = CONTEXT_HISTORY_TOKENS,
+        fold_share: float = SUMMARY_FOLD_SHARE,
+        max_batch: int = SUMMARY_MAX_BATCH,
+        max_tokens: int = SUMMARY_MAX_TOKENS,
+        enabled: bool = SUMMARY_ENABLED
+    ):
+        self.keep_recent = keep_recent
+        # The recent history is loaded keep_recent messages at a time, so the cache has to hold that many
+        chat_history_cache.ensure_capacity(keep_recent)
+        self.window_tokens = window_tokens
+        self.fold_share = fold_share
+        self.max_batch = max(max_batch, 1)
+        self.max_tokens = max_tokens
+        self.enabled = enabled
+        self.chain = SESSION_SUMMARY_PROMPT | tools_llm | StrOutputParser()
+        # Sessions with an update in flight; a turn finishing meanwhile is picked up by the next update
+        self._running: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.updates = 0
+        self.folded_messages = 0
+        self.skipped_busy = 0
+        self.failures = 0
+
+    async def get(self, session_id: str) -> str:
+        """
+        The stored summary of a session, empty if nothing has been summarized yet.
+        Served from the chat history cache when the session is cached there.
+        """
+        if not self.enabled:
+            return ""
+        summary = chat_history_cache.get_summary(session_id)
+        if summary is not None:
+            return summary
+        token = chat_history_cache.begin_summary_load()
+        async with AsyncSessionLocal() as db:
+            record = await get_session_summary(db, session_id)
+        summary = record.summary if record is not None else ""
+        chat_history_cache.put_summary(session_id, summary, token)
+        return summary
+
+    def _window_start(self, latest: List[Tuple[int, str, str]], share: float = 1.0) -> int:
+        """Id of the oldest message in the verbatim window, given the latest messages newest first."""
+        tokens = [content_tokens(content or "") for _, _, content in latest[:max(int(self.keep_recent * share), 1)]]
+        count = fitting_count(tokens, int(self.window_tokens * share))
+        # An empty window (the newest message alone is too long) starts after the newest message
+        return latest[count - 1][0] if count else latest[0][0] + 1
+
+    async def _load_batch(self, session_id: str) -> Tuple[str, List[Tuple[int, str, str]]]:
+        """
+        The stored summary and the messages to fold into it, empty while every unsummarized
+        message is still inside the verbatim window.
+        """
+        async with AsyncSessionLocal() as db:
+            record = await get_session_summary(db, session_id)
+            summary, summarized_until = (record.summary, record.summarized_until) if record is not None else ("", 0)
+            latest = await get_latest_messages(db, session_id, self.keep_recent)
+            if not latest:
+                return summary, []
+            rows = await get_messages_between(
+                db, session_id, summarized_until, self._window_start(latest, self.fold_share), self.max_batch
+            )
+        # The window of fold_share limits lies inside the full window, so rows start with the
+        # oldest unsummarized message; folding is only needed once it has left the full window
+        if not rows or rows[0][0] >= self._window_start(latest):
+            return summary, []
+        return summary, rows
+
+    async def _fold(self, summary: str, rows: List[Tuple[int, str, str]]) -> str:
+        messages = "\n".join(
+            f"{'User' if role == 'user' else 'Assistant'}: {truncate_to_tokens(content or '', SUMMARY_MESSAGE_MAX_TOKENS)}"
+            for _, role, content in rows
+        )
+        updated = await self.chain.ainvoke({
+            "summary": summary or "(empty)",
+            "messages": messages,
+            "max_words": int(self.max_tokens * 0.75),
+        })
+        return truncate_to_tokens(updated.strip(), self.max_tokens)
+
+    async def update(self, session_id: str, budget: Optional[RequestBudget] = None) -> bool:
+        """
+        Fold the unsummarized messages outside the recent window into the session's summary.
+        A backlog larger than max_batch, as left by sessions older than the summary, is folded
+        batch by batch.
+
+        Returns:
+            bool: Whether the stored summary changed.
+        """
+        budget = budget or RequestBudget(timeout=BACKGROUND_TIMEOUT, answer_reserve=0)
+        changed = False
+        while True:
+            summary, rows = await self._load_batch(session_id)
+            if not rows:
+                return changed
+            summary = await budget.run(self._fold(summary, rows), "session_summary")
+            async with AsyncSessionLocal() as db:
+                await save_session_summary(db, session_id, summary, rows[-1][0])
+            chat_history_cache.set_summary(session_id, summary)
+            self.updates += 1
+            self.folded_messages += len(rows)
+            changed = True
+            if len(rows) < self.max_batch:
+                return changed
+
+    async def _run(self, session_id: str):
+        try:
+            await self.update(session_id)
+        except Exception as e:
+            self.failures += 1
+            print(f"Error updating session summary: {e}")
+        finally:
+            self._running.discard(session_id)
+
+    def schedule(self, session_id: str):
+        """Update the session's summary in the background, unless an update is already running."""
+        if not self.enabled:
+            return
+        if session_id in self._running:
+            self.skipped_busy += 1
+            return
+        self._running.add(session_id)
+        task = asyncio.create_task(self._run(session_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "updates": self.updates,
+            "folded_messages": self.folded_messages,
+            "skipped_busy": self.skipped_busy,
+            "failures": self.failures,
+            "running": len(self._running),
+        }
+
+
+session_summarizer = SessionSummarizer()
@@ -1,43 +1,138 @@
+import os
+import re
+from typing import FrozenSet, List, Dict, Tuple
 from langchain_core.tools import Tool
-import chromadb
-from chromadb.utils import embedding_functions
-from app.utils.pdf_process import db_dir_path, collection_name
+from app.utils.pdf_process import get_collection, get_lexical_index, embedding_function
+from app.utils.lexical_index import reciprocal_rank_fusion, tokenize
+from app.utils.semantic_cache import SemanticCache
+from app.utils.executors import run_cpu, tool_executor
 
-collection_name = "pdf_collection"
+# Each retriever returns top_k * CANDIDATE_MULTIPLIER candidates before fusion
+CANDIDATE_MULTIPLIER = int(os.getenv("DOC_RETRIEVER_CANDIDATE_MULTIPLIER", "4"))
+RRF_K = int(os.getenv("DOC_RETRIEVER_RRF_K", "60"))
+RERANK_ENABLED = os.getenv("DOC_RETRIEVER_RERANK", "true").lower() in ("1", "true", "yes")
+RERANK_WEIGHT = float(os.getenv("DOC_RETRIEVER_RERANK_WEIGHT", "0.02"))
 
+# Near-identical questions reuse the formatted result until the PDF collection changes
+query_cache = SemanticCache()
 
+_CITATION_PATTERN = re.compile(r"^Document \d+ \(Source: (.+)\):$", re.MULTILINE)
+# Upper-case words of two or more letters in the original query (acronyms, codes)
+_ACRONYM_PATTERN = re.compile(r"\b[A-Z][A-Z0-9_]+\b")
 
-client = chromadb.PersistentClient(path=str(db_dir_path))
-embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-    model_name="all-MiniLM-L6-v2"
-)
+def format_citation(metadata: dict) -> str:
+    """Format the source of a chunk, with its page range when known."""
+    source = metadata.get("source", "Unknown source")
+    page, page_end = metadata.get("page"), metadata.get("page_end")
+    if page is None:
+        return source
+    if page_end and page_end != page:
+        return f"{source}, pages {page}-{page_end}"
+    return f"{source}, page {page}"
 
-collection = client.get_or_create_collection(
-    name=collection_name,
-    embedding_function=embedding_function
-)
+def extract_citations(formatted_results: str) -> List[str]:
+    """Get the citations back from the text returned by retrieve_documents."""
+    return list(dict.fromkeys(_CITATION_PATTERN.findall(formatted_results)))
+
+def _exact_terms(query: str) -> FrozenSet[str]:
+    """
+    Query terms that must match exactly for a cached result to be reused: tokens with a digit
+    (numbers, part codes, versions) and acronyms. Embeddings barely tell "error E-104" from
+    "error E-105", so these become part of the semantic cache namespace.
+    """
+    terms = {term for term in tokenize(query) if any(char.isdigit() for char in term)}
+    terms.update(term.lower() for term in _ACRONYM_PATTERN.findall(query))
+    return frozenset(terms)
+
+def _rerank(query: str, ranked: List[str], scores: Dict[str, float], chunks: Dict[str, Tuple[str, dict]]) -> List[str]:
+    """
+    Cheap re-rank: add a bonus proportional to the share of query terms found in the chunk,
+    so chunks containing every query term (identifiers, part numbers) move up.
+    """
+    terms = set(tokenize(query))
+    if not terms:
+        return ranked
+
+    def score(doc_id: str) -> float:
+        coverage = len(terms & set(tokenize(chunks[doc_id][0]))) / len(terms)
+        return scores[doc_id] + RERANK_WEIGHT * coverage
+
+    return sorted(ranked, key=score, reverse=True)
 
 def retrieve_documents(query: str, top_k: int = 5) -> str:
     """
-    Retrieve documents from the ChromaDB collection based on a query.
+    Retrieve documents from the ChromaDB collection based on a query (blocking).
+    See search_documents.
+    """
+    return search_documents(query, embedding_function([query])[0], top_k)
+
+async def aretrieve_documents(query: str, top_k: int = 5) -> str:
+    """
+    Async variant used by the agent: the query is embedded on the CPU pool, and the Chroma and
+    BM25 searches run on the tool pool, so neither touches the default executor.
+    """
+    query_embedding = (await run_cpu(embedding_function, [query]))[0]
+    return await tool_executor.run_in_pool(search_documents, query, query_embedding, top_k)
+
+def search_documents(query: str, query_embedding, top_k: int = 5) -> str:
+    """
+    Retrieve documents from the ChromaDB collection for a query and its embedding.
+    Dense (embedding) and lexical (BM25) results are fused with reciprocal rank fusion,
+    then optionally re-ranked by query term coverage. Results are served from the semantic
+    cache when a similar enough query with the same identifiers was answered since the
+    collection last changed.
     
     Args:
         query (str): The search query to find relevant documents.
+        query_embedding: Embedding of the query.
         top_k (int): The number of top results to return.
         
     Returns:
         String containing the formatted results.
     """
-    results = collection.query(query_texts=[query], n_results=top_k)
-    
-    if not results["documents"] or len(results["documents"][0]) == 0:
+    collection = get_collection()
+    lexical_index = get_lexical_index()
+    version = lexical_index.version()
+    cache_namespace = (top_k, _exact_terms(query))
+    cached = query_cache.get(query_embedding, version, namespace=cache_namespace)
+    if cached is not None:
+        return cached
+
+    candidates = top_k * CANDIDATE_MULTIPLIER
+    dense = collection.query(query_embeddings=[query_embedding.tolist()], n_results=candidates)
+    dense_ids = dense["ids"][0] if dense["ids"] else []
+    chunks = {
+        doc_id: (doc, metadata or {})
+        for doc_id, doc, metadata in zip(dense_ids, dense["documents"][0], dense["metadatas"][0])
+    } if dense_ids else {}
+    lexical_ids = lexical_index.search(query, candidates)
+
+    scores = reciprocal_rank_fusion([dense_ids, lexical_ids], k=RRF_K)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    pool = ranked[:top_k * 2] if RERANK_ENABLED else ranked[:top_k]
+
+    # Lexical-only hits are not in the dense results yet
+    missing = [doc_id for doc_id in pool if doc_id not in chunks]
+    if missing:
+        fetched = collection.get(ids=missing, include=["documents", "metadatas"])
+        for doc_id, doc, metadata in zip(fetched["ids"], fetched["documents"], fetched["metadatas"]):
+            chunks[doc_id] = (doc, metadata or {})
+    pool = [doc_id for doc_id in pool if doc_id in chunks]
+
+    if RERANK_ENABLED:
+        pool = _rerank(query, pool, scores, chunks)
+    results = pool[:top_k]
+
+    if not results:
+        # Not cached: the collection may be filled at any time by an ingestion run in another process
         return "No documents found matching the query."
     
     formatted_results = ""
-    for i, (doc, metadata) in enumerate(zip(results["documents"][0], results["metadatas"][0])):
-        source = metadata.get("source", "Unknown source")
-        formatted_results += f"Document {i+1} (Source: {source}):\n{doc}\n\n"
+    for i, doc_id in enumerate(results):
+        doc, metadata = chunks[doc_id]
+        formatted_results += f"Document {i+1} (Source: {format_citation(metadata)}):\n{doc}\n\n"
     
+    query_cache.put(query_embedding, formatted_results, version, namespace=cache_namespace)
     return formatted_results
 
 # Create a Tool for LangChain
@@ -45,4 +140,5 @@ doc_retriever = Tool(
     name="doc_retriever",
     description="Retrieve relevant information from stored documents based on a query",
     func=retrieve_documents,
+    coroutine=aretrieve_documents,
 )
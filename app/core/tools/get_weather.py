@@ -1,16 +1,24 @@
 import os
-import requests
+import aiohttp
 from typing import Optional, Dict, Any
 from dotenv import load_dotenv
 from datetime import datetime
 from langchain_core.tools import Tool
+from app.utils.http_client import fetch_json
+from app.utils.tool_cache import tool_cache
 
 load_dotenv()
 
 api_key = os.getenv("OPENWEATHER_API_KEY", "")
 base_url = "https://api.openweathermap.org/data/2.5/weather"
 
-def get_weather_func(city_name: str = "") -> str:
+@tool_cache.cached("ip_location")
+async def get_ip_location() -> str:
+    """Approximate 'lat,lon' of this server's public IP, cached since it rarely changes."""
+    location = await fetch_json("https://ipinfo.io/json")
+    return location.get("loc", "")
+
+async def get_weather_func(city_name: str = "") -> str:
     """
     Get current weather information for a specific city or based on IP location if no city is provided.
     
@@ -31,7 +39,7 @@ def get_weather_func(city_name: str = "") -> str:
     else:
         # Otherwise use IP location
         try:
-            loc = requests.get("https://ipinfo.io/json").json().get("loc", "").split(",")
+            loc = (await get_ip_location()).split(",")
             lat, lon = map(float, loc) if loc else (None, None)
             
             if lat is None or lon is None:
@@ -43,9 +51,11 @@ def get_weather_func(city_name: str = "") -> str:
             return f"Error determining location: {str(e)}. Please provide a city name."
 
     try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()
-        weather_data = response.json()
+        # The API key is left out of the cache key
+        query = {name: value for name, value in params.items() if name != "appid"}
+        weather_data = await tool_cache.get_or_call(
+            "get_weather", query, lambda: fetch_json(base_url, params=params)
+        )
         
         result = {
             "location": f"{weather_data['name']}, {weather_data['sys']['country']}",
@@ -69,8 +79,8 @@ def get_weather_func(city_name: str = "") -> str:
         semantic_result += f"- Time: {result.get('datetime', 'N/A')}"
             
         return semantic_result
-    except requests.exceptions.HTTPError as err:
-        if err.response.status_code == 404:
+    except aiohttp.ClientResponseError as err:
+        if err.status == 404:
             return f"City '{city_name}' not found. Please check the spelling or try another city."
         else:
             return f"Error retrieving weather data: {str(err)}"
@@ -80,5 +90,6 @@ def get_weather_func(city_name: str = "") -> str:
 get_weather = Tool(
     name="get_weather",
     description="Get current weather information for a city. If no city is provided, uses Hanoi as default.",
-    func=get_weather_func
+    func=None,
+    coroutine=get_weather_func
 )
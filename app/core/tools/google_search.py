@@ -1,3 +1,5 @@
+import asyncio
+from typing import Any, Dict, List
 from langchain_core.tools import Tool
 
 import os
@@ -8,28 +10,91 @@ cse_id = os.getenv('GOOGLE_CSE_ID', 'your-google-cse-id-here')
 search_key = os.getenv("GOOGLE_SEARCH_API_KEY", "your-google-api-key-here")
 
 print(f"Using CSE ID: {cse_id}")
-print(f"Using Search API Key: {search_key}")
+
+# Number of pages returned to the agent
+NUM_RESULTS = int(os.getenv("GOOGLE_SEARCH_NUM_RESULTS", "3"))
+# Extra links fetched in parallel, so a slow or failing page is replaced by the next one that answers
+EXTRA_CANDIDATES = int(os.getenv("GOOGLE_SEARCH_EXTRA_CANDIDATES", "2"))
+# Every page fetch starts at once, so this is also the deadline of the whole fan-out
+PAGE_FETCH_TIMEOUT = float(os.getenv("GOOGLE_SEARCH_PAGE_TIMEOUT", "5"))
+# Custom Search returns at most 10 results per request
+MAX_SEARCH_RESULTS = 10
 
 from langchain_google_community import GoogleSearchAPIWrapper
-from app.core.tools.request_url import fetch_webpage_content
+from app.core.tools.request_url import fetch_page_text
+from app.utils.resources import LazyResource
+from app.utils.tool_cache import tool_cache
+from app.utils.executors import tool_executor
+
+# The wrapper builds the Google API client, so it is created on first use or during warm-up
+search = LazyResource("google_search", lambda: GoogleSearchAPIWrapper(google_cse_id=cse_id, google_api_key=search_key))
+
+def search_top(query : str, num_results : int = NUM_RESULTS) -> List[Dict[str, Any]]:
+    return search.get().results(query = query, num_results = num_results)
 
-search = GoogleSearchAPIWrapper(google_cse_id=cse_id,google_api_key=search_key)
 def search_top3(query : str):
-    return search.results(query = query, num_results = 3)
+    return search_top(query, 3)
+
+async def search_top_cached(query : str, num_results : int = NUM_RESULTS) -> List[Dict[str, Any]]:
+    # The Google API client is synchronous, so the search runs on the tool pool
+    return await tool_cache.get_or_call(
+        "google_search",
+        {"query": query, "num_results": num_results},
+        lambda: tool_executor.run_in_pool(search_top, query, num_results)
+    )
+
+async def _fetch_with_deadline(url: str) -> str:
+    return await asyncio.wait_for(fetch_page_text(url), PAGE_FETCH_TIMEOUT)
 
-def search_and_fetch_content(query : str):
-    search_res = search_top3(query)
+async def fetch_first_pages(pages: List[Dict[str, Any]], num_results: int) -> Dict[int, str]:
+    """
+    Fetch all result pages concurrently and keep the first num_results that succeed.
+    Pages still loading once enough have arrived, or past their deadline, are cancelled.
 
-    for page in search_res : 
-        if 'link' in page:
-            page['content'] = fetch_webpage_content(page['link'])
-    
-    semantic_result = "\n\n".join([f"Link: {page['link']}\n {page['content']}" for page in search_res])
+    Returns:
+        Dict[int, str]: Extracted content keyed by the page's position in the search results.
+    """
+    tasks = {
+        asyncio.create_task(_fetch_with_deadline(page['link'])): index
+        for index, page in enumerate(pages) if 'link' in page
+    }
+    contents: Dict[int, str] = {}
+    pending = set(tasks)
+    try:
+        while pending and len(contents) < num_results:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None and len(contents) < num_results:
+                    contents[tasks[task]] = task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+    return contents
+
+async def search_and_fetch_content(query : str, num_results : int = NUM_RESULTS):
+    candidates = min(num_results + EXTRA_CANDIDATES, MAX_SEARCH_RESULTS)
+    search_res = await search_top_cached(query, candidates)
+    contents = await fetch_first_pages(search_res, num_results)
+
+    # Keep search rank order; when fewer pages loaded in time, fall back to the result snippets
+    selected = [index for index in range(len(search_res)) if index in contents]
+    fallback = [index for index in range(len(search_res)) if index not in contents and 'link' in search_res[index]]
+    selected = sorted(selected + fallback[:max(num_results - len(selected), 0)])
+
+    if not selected:
+        return "No good Google Search Result was found"
+
+    pages = []
+    for index in selected:
+        page = search_res[index]
+        content = contents.get(index) or f"Snippet: {page.get('snippet', '')}"
+        pages.append(f"Link: {page['link']}\n {content}")
+    semantic_result = "\n\n".join(pages)
     return semantic_result 
 
 google_search = Tool(
     name="google_search",
     description="Search Google for recent results.",
-    func=search_and_fetch_content,
+    func=None,
+    coroutine=search_and_fetch_content,
 )
-
@@ -1,25 +1,45 @@
-import requests
-from app.utils.html_process import process_html_content
+from contextlib import aclosing
+
+from app.utils.html_process import StreamingHTMLExtractor, format_html_result
+from app.utils.http_client import iter_response_text
+from app.utils.tool_cache import tool_cache
+from app.utils.executors import run_cpu
 from langchain_core.tools import Tool
 
-def fetch_webpage_content(url: str):
-        try:
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            }
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
+MAX_CONTENT_LENGTH = 2000
+
+@tool_cache.cached("fetch_web")
+async def fetch_page_text(url: str, budget: int = MAX_CONTENT_LENGTH) -> str:
+        """
+        Fetch a webpage through the shared HTTP session and extract its main text.
+        The body is parsed while it streams in, and the download stops as soon as
+        enough content has been extracted.
 
-            string_results = process_html_content(response.text)
-            final_results = string_results[:2000] if len(string_results) > 2000 else string_results
-            
-            return final_results
+        Raises:
+            aiohttp.ClientError: If the request fails.
+        """
+        extractor = StreamingHTMLExtractor(budget=budget)
+        async with aclosing(iter_response_text(url)) as parts:
+            async for part in parts:
+                # Parsing is CPU work, keep it off the event loop
+                await run_cpu(extractor.feed, part)
+                if extractor.done:
+                    break
+        extractor.close()
+
+        string_results = format_html_result(extractor.result())
+        return string_results[:budget]
+
+async def fetch_webpage_content(url: str) -> str:
+        try:
+            return await fetch_page_text(url)
         except Exception as e:
-            return {"error": str(e)}
+            return f"Error fetching {url}: {str(e)}"
         
 
 fetch_web = Tool(
     name="fetch_web",
     description="Fetches the content of a webpage given its URL.",
-    func=fetch_webpage_content,
-)
\ No newline at end of file
+    func=None,
+    coroutine=fetch_webpage_content,
+)
@@ -1,6 +1,8 @@
 from app.core import tools
 from app.core.tools import all_tools
 from app.core.llm import tools_llm
+from app.core.budget import RequestBudget, BudgetExceeded, PLANNING_TIMEOUT, TOOL_TIMEOUT
+from app.utils.executors import tool_executor
 from langchain_core.messages import AIMessage, ToolMessage, BaseMessage, HumanMessage
 from typing import List, Optional, Dict, Any, Tuple, Union
 import asyncio
@@ -11,14 +13,32 @@ class ToolsAgent :
         self.llm_with_tools = tools_llm.bind_tools(list(all_tools.values()))
         self.tools_map = all_tools
     
-    async def select_tool(self, query: str, recent_chat_history : List[BaseMessage]):
+    async def select_tool(self, query: str, recent_chat_history : List[BaseMessage], budget: Optional[RequestBudget] = None):
         messages : List[BaseMessage] = list(recent_chat_history)
         messages.append(HumanMessage(content=query))
-        response = await self.llm_with_tools.ainvoke(messages)
-        
-        return response.content, response.tool_calls
+        if budget is None:
+            response = await self.llm_with_tools.ainvoke(messages)
+            return response.content, response.tool_calls
+
+        response = await budget.run(
+            self.llm_with_tools.ainvoke(messages), "select_tool",
+            timeout=PLANNING_TIMEOUT, reserve=budget.answer_reserve
+        )
+        tool_calls = response.tool_calls
+        if len(tool_calls) > budget.max_tool_calls:
+            budget.degrade("tool_calls_limited")
+            tool_calls = tool_calls[:budget.max_tool_calls]
+        return response.content, tool_calls
     
-    async def run_tool(self, tool_call: Dict[str, Any]):
+    async def _invoke(self, tool, tool_args):
+        # Calls go through the tool executor, which limits concurrency per tool
+        if getattr(tool, "coroutine", None) is not None:
+            # Async tools (network I/O) run on the event loop
+            return await tool_executor.run(tool.name, tool.ainvoke, tool_args)
+        # Synchronous tools run on the executor's own thread pool
+        return await tool_executor.run(tool.name, tool.invoke, tool_args)
+
+    async def run_tool(self, tool_call: Dict[str, Any], budget: Optional[RequestBudget] = None):
         tool_name = tool_call.get("name")
         tool_args = tool_call.get("args", {})
         tool_call_id = tool_call.get("id", "tool_call_id_not_provided")
@@ -26,13 +46,25 @@ class ToolsAgent :
         if not tool:
             raise ValueError(f"Tool '{tool_name}' not found.")
         try:
-            # Run synchronous tool.invoke in a separate thread
-            result = await asyncio.to_thread(tool.invoke, tool_args)
+            if budget is None:
+                result = await self._invoke(tool, tool_args)
+            else:
+                # A thread running a sync tool cannot be interrupted, but the turn stops waiting for it
+                result = await budget.run(
+                    self._invoke(tool, tool_args), f"tool:{tool_name}",
+                    timeout=TOOL_TIMEOUT, reserve=budget.answer_reserve
+                )
             return ToolMessage(
                 content=result,
                 name=tool_name,
                 tool_call_id=tool_call_id
             )
+        except BudgetExceeded:
+            return ToolMessage(
+                content=f"Tool '{tool_name}' did not finish in time, no result is available.",
+                name=tool_name,
+                tool_call_id=tool_call_id
+            )
         except Exception as e:
             return ToolMessage(
                 content=f"Error running tool '{tool_name}': {str(e)}",
@@ -1,55 +1,187 @@
-from sqlalchemy.orm import Session as DBSession
-from app.models.orm import Message, Session  # Use ORM models instead of Pydantic models
+from typing import List, Tuple, Optional
+from sqlalchemy import select, delete, update, func, or_, and_, type_coerce, String
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.orm import Message, Session, SessionSummary  # Use ORM models instead of Pydantic models
 
-def create_session(db: DBSession):
+async def create_session(db: AsyncSession):
     """
     Create a new session in the database and return its ID.
     """
     session = Session()
     db.add(session)
-    db.commit()
-    db.refresh(session)
+    await db.commit()
     return session.id
 
-def add_message_to_session(db: DBSession, session_id: str, role: str, content: str):
+async def add_message_to_session(db: AsyncSession, session_id: str, role: str, content: str):
     """
     Add a message to a session in the database.
     """
+    await _ensure_session(db, session_id)
     message = Message(session_id=session_id, role=role, content=content)
     db.add(message)
-    db.commit()
-    db.refresh(message)
+    await _touch_session(db, session_id)
+    await db.commit()
+    await db.refresh(message)
     return message
 
-def get_session_messages(db: DBSession, session_id: str):
+async def _ensure_session(db: AsyncSession, session_id: str):
     """
-    Get all messages for a session from the database, sorted by timestamp (oldest first).
+    Create the session row if it does not exist yet. Clients get a session id before its first
+    turn is stored, so a turn can never assume the row was created by an earlier one.
     """
-    return db.query(Message).filter(Message.session_id == session_id).order_by(Message.timestamp.asc()).all()
+    await db.execute(sqlite_insert(Session).values(id=session_id).on_conflict_do_nothing(index_elements=["id"]))
+
+async def _touch_session(db: AsyncSession, session_id: str):
+    """
+    Bump updated_at of a session. The column's onupdate only fires when the session row itself
+    is updated, so adding messages has to do it explicitly.
+    """
+    await db.execute(update(Session).where(Session.id == session_id).values(updated_at=func.now()))
+
+async def stage_turn(db: AsyncSession, session_id: str, messages: List[Tuple[str, str]], new_session: bool = False):
+    """
+    Stage the writes of one chat turn on db without committing.
+    
+    Args:
+        db: The database session to stage the writes on.
+        session_id: The ID of the session the messages belong to.
+        messages: (role, content) pairs in the order they were sent.
+        new_session: Whether the session was started by this turn. The session row is created
+            whenever it is missing, so this is only a hint that skips bumping updated_at.
+    """
+    await _ensure_session(db, session_id)
+    db.add_all([Message(session_id=session_id, role=role, content=content) for role, content in messages])
+    if not new_session:
+        await _touch_session(db, session_id)
+
+async def save_turn(db: AsyncSession, session_id: str, user_content: str, assistant_content: str, new_session: bool = False):
+    """
+    Store the user and assistant messages of a turn and bump the session's updated_at
+    in a single transaction.
+    """
+    await stage_turn(db, session_id, [("user", user_content), ("assistant", assistant_content)], new_session)
+    await db.commit()
+
+# Keyset cursors compare against the raw stored text of the datetime columns: SQLite stores
+# CURRENT_TIMESTAMP without microseconds, so a bound Python datetime would never compare equal
+_message_ts_key = type_coerce(Message.timestamp, String)
+_session_ts_key = type_coerce(Session.updated_at, String)
+
+async def get_session_messages(db: AsyncSession, session_id: str, limit: int = 100, before: Optional[Tuple[str, int]] = None):
+    """
+    Get a page of messages for a session, sorted by timestamp (oldest first).
+    The page holds the latest `limit` messages older than the `before` cursor, walking
+    the (session_id, timestamp) index instead of loading the whole session.
+    
+    Returns:
+        List of dicts with the message columns plus `ts_key`, the raw timestamp used for cursors.
+    """
+    query = select(
+        Message.id, Message.session_id, Message.role, Message.content, Message.timestamp,
+        _message_ts_key.label("ts_key")
+    ).where(Message.session_id == session_id)
+    if before is not None:
+        ts_key, message_id = before
+        query = query.where(or_(
+            _message_ts_key < ts_key,
+            and_(_message_ts_key == ts_key, Message.id < message_id)
+        ))
+    # Messages of one turn share the same timestamp, so id keeps them in insertion order
+    query = query.order_by(Message.timestamp.desc(), Message.id.desc()).limit(limit)
+    result = await db.execute(query)
+    return [dict(row) for row in result.mappings().all()][::-1]
 
 
-def get_all_sessions(db: DBSession, skip: int = 0, limit: int = 100):
+async def get_all_sessions(db: AsyncSession, limit: int = 100, after: Optional[Tuple[str, str]] = None, skip: int = 0):
     """
-    Get all sessions from the database, sorted by updated_at (newest first).
+    Get a page of sessions from the database, sorted by updated_at (newest first).
+    The page starts right after the `after` cursor of the previous page. `skip` is the
+    deprecated offset paging, which still scans the skipped rows.
+    
+    Returns:
+        List of dicts with the session columns plus `ts_key`, the raw updated_at used for cursors.
     """
-    return db.query(Session).order_by(Session.updated_at.desc()).offset(skip).limit(limit).all()
+    query = select(
+        Session.id, Session.system_prompt, Session.created_at, Session.updated_at,
+        _session_ts_key.label("ts_key")
+    )
+    if after is not None:
+        ts_key, session_id = after
+        query = query.where(or_(
+            _session_ts_key < ts_key,
+            and_(_session_ts_key == ts_key, Session.id < session_id)
+        ))
+    query = query.order_by(Session.updated_at.desc(), Session.id.desc()).limit(limit)
+    if skip:
+        query = query.offset(skip)
+    result = await db.execute(query)
+    return [dict(row) for row in result.mappings().all()]
 
 
-def delete_session(db: DBSession, session_id: str):
+async def delete_session(db: AsyncSession, session_id: str):
     """
-    Delete a session and all its messages from the database.
+    Delete a session, all its messages and its rolling summary from the database.
     Returns True if successful, False if the session was not found.
     """
-    # Messages will be deleted automatically due to cascade="all, delete-orphan"
-    # db.query(Message).filter(Message.session_id == session_id).delete() 
-    result = db.query(Session).filter(Session.id == session_id).delete()
-    db.commit()
+    # Bulk deletes skip the ORM cascade, so messages are removed explicitly in the same transaction
+    await db.execute(delete(Message).where(Message.session_id == session_id))
+    await db.execute(delete(SessionSummary).where(SessionSummary.session_id == session_id))
+    result = await db.execute(delete(Session).where(Session.id == session_id))
+    await db.commit()
     
-    return result > 0  # Returns True if at least one row was deleted
+    return result.rowcount > 0  # Returns True if at least one row was deleted
 
 
-def get_session(db: DBSession, session_id: str):
+async def get_session(db: AsyncSession, session_id: str):
     """
     Get a specific session by ID.
     """
-    return db.query(Session).filter(Session.id == session_id).first()
\ No newline at end of file
+    result = await db.execute(select(Session).where(Session.id == session_id))
+    return result.scalars().first()
+
+async def get_session_summary(db: AsyncSession, session_id: str):
+    """
+    Get the rolling summary of a session, or None if nothing has been summarized yet.
+    """
+    result = await db.execute(select(SessionSummary).where(SessionSummary.session_id == session_id))
+    return result.scalars().first()
+
+async def get_latest_messages(db: AsyncSession, session_id: str, limit: int):
+    """
+    Get the latest messages of a session, newest first.
+
+    Returns:
+        List of (id, role, content) tuples.
+    """
+    query = select(Message.id, Message.role, Message.content).where(Message.session_id == session_id) \
+        .order_by(Message.id.desc()).limit(limit)
+    result = await db.execute(query)
+    return [tuple(row) for row in result.all()]
+
+async def get_messages_between(db: AsyncSession, session_id: str, after_id: int, before_id: int, limit: int):
+    """
+    Get the messages of a session with after_id < id < before_id, oldest first.
+
+    Returns:
+        List of (id, role, content) tuples, at most `limit` of them.
+    """
+    query = select(Message.id, Message.role, Message.content).where(
+        Message.session_id == session_id,
+        Message.id > after_id,
+        Message.id < before_id
+    ).order_by(Message.id).limit(limit)
+    result = await db.execute(query)
+    return [tuple(row) for row in result.all()]
+
+async def save_session_summary(db: AsyncSession, session_id: str, summary: str, summarized_until: int):
+    """
+    Create or replace the rolling summary of a session.
+    """
+    record = await get_session_summary(db, session_id)
+    if record is None:
+        db.add(SessionSummary(session_id=session_id, summary=summary, summarized_until=summarized_until))
+    else:
+        record.summary = summary
+        record.summarized_until = summarized_until
+    await db.commit()
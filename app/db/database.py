@@ -1,29 +1,51 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from app.core.memory.user_assisstant_memory import get_or_create_ua_collection
 
 DATABASE_URL = "sqlite:///./data/database.db"
+ASYNC_DATABASE_URL = "sqlite+aiosqlite:///./data/database.db"
 
+# WAL lets readers run alongside the single writer, and synchronous=NORMAL only fsyncs at checkpoints
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "cache_size": -64000,  # 64 MB page cache
+    "temp_store": "MEMORY",
+}
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+# Sync engine, used for schema creation and scripts
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+event.listen(engine, "connect", _set_sqlite_pragmas)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine, used by the request handlers so disk I/O never blocks the event loop
+async_engine = create_async_engine(ASYNC_DATABASE_URL)
+event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 def init_db():
     """
     Create the database tables if they do not exist.
-    Create the user and assistant memory collections in ChromaDB if not exist.
+    The memory collections in ChromaDB are created on first use or during warm-up.
     """
+    # Registers the ORM models on Base before the tables are created
+    import app.models.orm  # noqa: F401
     Base.metadata.create_all(bind=engine)
-    get_or_create_ua_collection() 
     print("Database initialized and tables created.")
 
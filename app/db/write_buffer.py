@@ -0,0 +1,95 @@
+import os
+import asyncio
+from dataclasses import dataclass
+from typing import List, Tuple, Optional
+
+from app.db.database import AsyncSessionLocal
+from app.db.crud import stage_turn
+
+GROUP_COMMIT_ENABLED = os.getenv("DB_GROUP_COMMIT", "false").lower() in ("1", "true", "yes")
+GROUP_COMMIT_INTERVAL = float(os.getenv("DB_GROUP_COMMIT_INTERVAL", "0.05"))  # seconds
+GROUP_COMMIT_MAX_BATCH = int(os.getenv("DB_GROUP_COMMIT_MAX_BATCH", "256"))
+
+
+@dataclass
+class TurnWrite:
+    session_id: str
+    messages: List[Tuple[str, str]]
+    new_session: bool = False
+
+
+class GroupCommitBuffer:
+    """
+    Coalesce turn writes from many concurrent sessions into one transaction.
+    A write waits at most flush_interval seconds (or until max_batch writes are pending)
+    before it is committed together with every other pending write.
+    """
+    def __init__(self, session_factory=AsyncSessionLocal, flush_interval: float = GROUP_COMMIT_INTERVAL, max_batch: int = GROUP_COMMIT_MAX_BATCH):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._pending: List[Tuple[TurnWrite, asyncio.Future]] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Start the background flush loop. Must be called from a running event loop."""
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop and commit whatever is still pending."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def add_turn(self, session_id: str, user_content: str, assistant_content: str, new_session: bool = False):
+        """
+        Queue the messages of a turn and wait until the batch containing them is committed.
+        """
+        write = TurnWrite(session_id, [("user", user_content), ("assistant", assistant_content)], new_session)
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((write, future))
+        if len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+        await future
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Commit all pending writes in a single transaction."""
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        try:
+            async with self.session_factory() as db:
+                for write, _ in batch:
+                    await stage_turn(db, write.session_id, write.messages, write.new_session)
+                await db.commit()
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for _, future in batch:
+            if not future.done():
+                future.set_result(None)
+
+
+write_buffer = GroupCommitBuffer()
@@ -1,16 +1,20 @@
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, JSONResponse
+import asyncio
 import os
 
 from app.api.chat_router import router as chat_router
-from app.db.database import engine, Base
-
-# Create database tables
-from app.db.database import init_db
-init_db()
+from app.api.metrics_router import router as metrics_router
+from app.db.database import engine, Base, init_db
+from app.db.write_buffer import write_buffer, GROUP_COMMIT_ENABLED
+from app.utils.resources import warm_up, readiness
+from app.utils.http_client import close_session
+from app.utils.executors import tool_executor, cpu_executor
+from app.core.memory.user_assisstant_memory import memory_store, MEMORY_COMPACTION_INTERVAL
 
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "true").lower() in ("1", "true", "yes")
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -26,9 +30,63 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # Keyset pagination cursor of the list endpoints
 )
 
 app.include_router(chat_router)
+app.include_router(metrics_router)
+
+@app.on_event("startup")
+async def create_tables():
+    # Only the SQLite schema is created here; models and Chroma clients load during warm-up
+    await asyncio.to_thread(init_db)
+
+@app.on_event("startup")
+async def start_write_buffer():
+    if GROUP_COMMIT_ENABLED:
+        write_buffer.start()
+
+@app.on_event("startup")
+async def start_warm_up():
+    if WARMUP_ON_STARTUP:
+        # Keep a reference on the app so the task is not garbage collected
+        app.state.warm_up_task = asyncio.create_task(warm_up())
+    else:
+        readiness["ready"] = True
+
+@app.on_event("startup")
+async def start_memory_compaction():
+    if MEMORY_COMPACTION_INTERVAL > 0:
+        app.state.memory_compaction_task = asyncio.create_task(memory_store.compaction_loop(MEMORY_COMPACTION_INTERVAL))
+
+@app.get("/healthz")
+async def healthz():
+    """
+    Readiness probe: 503 while models and collections are warming up, 200 afterwards.
+    """
+    return JSONResponse(
+        status_code=200 if readiness["ready"] else 503,
+        content={"status": "ok" if readiness["ready"] else "warming_up", **readiness}
+    )
+
+@app.on_event("shutdown")
+async def stop_write_buffer():
+    await write_buffer.stop()
+
+@app.on_event("shutdown")
+async def stop_memory_compaction():
+    task = getattr(app.state, "memory_compaction_task", None)
+    if task is not None:
+        task.cancel()
+
+@app.on_event("shutdown")
+async def close_http_session():
+    await close_session()
+
+@app.on_event("shutdown")
+async def stop_executors():
+    tool_executor.shutdown()
+    cpu_executor.shutdown()
 
 frontend_folder = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "frontend")
 app.mount("/frontend", StaticFiles(directory=frontend_folder), name="frontend")
@@ -33,4 +33,17 @@ class Message(Base):
 
     __table_args__ = (
         Index('ix_messages_session_id_timestamp', "session_id", "timestamp"),
-    )
\ No newline at end of file
+    )
+
+class SessionSummary(Base):
+    """
+    ORM model for the rolling summary of a session.
+    - Tóm tắt các tin nhắn cũ đã rời khỏi cửa sổ lịch sử gần đây, cập nhật dần sau mỗi lượt.
+    """
+    __tablename__ = "session_summaries"
+
+    session_id = Column(String, ForeignKey("sessions.id"), primary_key=True)
+    summary = Column(Text, nullable=False, default="")
+    # Last message folded into the summary; later messages are still to be summarized
+    summarized_until = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
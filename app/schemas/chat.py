@@ -7,6 +7,7 @@ class ChatRequest(BaseModel):
     """
     message : str
     session_id : Optional[str]
+    user_id : Optional[str] = None # Owner of long-term memories, the shared partition if omitted. Not authenticated: any client can claim any id
 
 class ChatResponse(BaseModel):
     """
@@ -0,0 +1,22 @@
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+class MemoryPlan(BaseModel):
+    """
+    Structured output of the memory planner: what to look up in long-term memory
+    for the current message and what to remember from the conversation.
+    """
+    query_user : Optional[str] = Field(None, description="Query phrase for memories about the user, null if none are needed")
+    query_assistant : Optional[str] = Field(None, description="Query phrase for memories about the assistant, null if none are needed")
+    store_user : List[str] = Field(default_factory=list, description="New facts about the user worth remembering")
+    store_assistant : List[str] = Field(default_factory=list, description="New facts about the assistant worth remembering")
+
+    def queries(self) -> dict:
+        """Non-empty query phrases keyed by role."""
+        queries = {"user": self.query_user, "assistant": self.query_assistant}
+        return {role: query.strip() for role, query in queries.items() if query and query.strip()}
+
+    def facts(self) -> dict:
+        """Non-empty facts to store keyed by role."""
+        facts = {"user": self.store_user, "assistant": self.store_assistant}
+        return {role: [fact.strip() for fact in items if fact.strip()] for role, items in facts.items() if any(fact.strip() for fact in items)}
@@ -0,0 +1,301 @@
+import os
+import re
+import json
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from chromadb.utils import embedding_functions
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process lock applies
+    fcntl = None
+
+EMBEDDING_CACHE_DIR = Path(os.getenv("EMBEDDING_CACHE_DIR", "data/embedding_cache"))
+EMBEDDING_CACHE_MEMORY_ITEMS = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "20000"))
+EMBEDDING_CACHE_PERSISTENT = os.getenv("EMBEDDING_CACHE_PERSISTENT", "true").lower() in ("1", "true", "yes")
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text before hashing so trivially different strings share one cache entry."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def text_key(model_name: str, text: str) -> str:
+    return hashlib.sha256(f"{model_name}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class DiskEmbeddingStore:
+    """
+    Persistent embedding tier: an append-only float32 matrix read through np.memmap,
+    plus an index file whose lines are "<key> <row>".
+    Several processes (uvicorn workers, the ingestion CLI) may share a directory, so every
+    append takes an exclusive file lock, places its rows at the current end of the matrix
+    and records those row numbers in the index; the rows of other processes are picked up
+    from the index before each append.
+    """
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.vectors_path = directory / "vectors.f32"
+        self.index_path = directory / "index.txt"
+        self.meta_path = directory / "meta.json"
+        self.lock_path = directory / "lock"
+        self.dim: Optional[int] = None
+        self.rows: Dict[str, int] = {}
+        self._row_count = 0  # rows covered by the index, i.e. the readable part of the matrix
+        self._index_offset = 0  # bytes of the index file already read
+        self._matrix: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        with self._file_lock():
+            self._load()
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock shared by every process using the directory."""
+        with open(self.lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @property
+    def _row_bytes(self) -> int:
+        return 4 * self.dim
+
+    def _read_meta(self):
+        if self.dim is None and self.meta_path.exists():
+            with open(self.meta_path, "r") as f:
+                self.dim = json.load(f)["dim"]
+
+    def _read_index(self):
+        """
+        Read the index lines appended since the last call (file lock held).
+        A trailing partial line, left by a writer that crashed mid-write, is cut off.
+        """
+        if not self.index_path.exists():
+            return
+        with open(self.index_path, "rb+") as f:
+            f.seek(self._index_offset)
+            data = f.read()
+            complete = data.rfind(b"\n") + 1
+            if complete < len(data):
+                f.truncate(self._index_offset + complete)
+        line_number = self._row_count
+        for line in data[:complete].decode("utf-8").splitlines():
+            parts = line.split()
+            if not parts:
+                continue
+            # Lines written before row numbers were recorded hold only the key, in row order
+            row = int(parts[1]) if len(parts) > 1 else line_number
+            self.rows[parts[0]] = row
+            self._row_count = max(self._row_count, row + 1)
+            line_number += 1
+        self._index_offset += complete
+
+    def _load(self):
+        """Read the store from disk (file lock held), dropping vector rows no index line refers to."""
+        self._read_meta()
+        if self.dim is None:
+            return
+        self._read_index()
+        if self.vectors_path.exists() and self.vectors_path.stat().st_size > self._row_count * self._row_bytes:
+            # Vectors are written before their index lines, a crash in between leaves unindexed rows
+            os.truncate(self.vectors_path, self._row_count * self._row_bytes)
+
+    def _matrix_view(self) -> Optional[np.memmap]:
+        if self._matrix is None or self._matrix.shape[0] < self._row_count:
+            if not self._row_count:
+                return None
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(self._row_count, self.dim))
+        return self._matrix
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self.rows.get(key)
+            if row is None:
+                return None
+            return np.array(self._matrix_view()[row])
+
+    def put_many(self, keys: List[str], vectors: np.ndarray):
+        with self._lock:
+            if all(key in self.rows for key in keys):
+                return
+            with self._file_lock():
+                self._read_meta()
+                if self.dim is None:
+                    self.dim = int(vectors.shape[1])
+                    with open(self.meta_path, "w") as f:
+                        json.dump({"dim": self.dim}, f)
+                # Another process may have stored some of the keys meanwhile
+                self._read_index()
+                new = {}
+                for key, vector in zip(keys, vectors):
+                    if key not in self.rows:
+                        new.setdefault(key, vector)
+                if not new:
+                    return
+                # Rows go right after the last indexed row, overwriting unindexed bytes of a crashed writer
+                first_row = self._row_count
+                mode = "r+b" if self.vectors_path.exists() else "wb"
+                with open(self.vectors_path, mode) as f:
+                    f.seek(first_row * self._row_bytes)
+                    f.write(np.asarray(list(new.values()), dtype=np.float32).tobytes())
+                    f.truncate()
+                    f.flush()
+                    os.fsync(f.fileno())
+                with open(self.index_path, "a") as f:
+                    f.write("".join(f"{key} {first_row + i}\n" for i, key in enumerate(new)))
+                # Picks up the lines just written, advancing the index offset past them
+                self._read_index()
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class CachedEmbeddingFunction(embedding_functions.EmbeddingFunction):
+    """
+    Content-addressed cache in front of an embedding function.
+    Entries are keyed by (model name, normalized text hash) and looked up in an in-memory LRU,
+    then in the persistent memory-mapped tier; only misses reach the wrapped model,
+    which is created by factory on the first miss (or on load()).
+    """
+    def __init__(
+        self,
+        factory: Callable[[], Callable],
+        model_name: str,
+        max_memory_items: int = EMBEDDING_CACHE_MEMORY_ITEMS,
+        persistent: bool = EMBEDDING_CACHE_PERSISTENT,
+        cache_dir: Path = EMBEDDING_CACHE_DIR
+    ):
+        self._factory = factory
+        self._embedding_function: Optional[Callable] = None
+        self._load_lock = threading.Lock()
+        self.model_name = model_name
+        self.max_memory_items = max_memory_items
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.disk = DiskEmbeddingStore(cache_dir / re.sub(r"[^A-Za-z0-9._-]", "_", model_name)) if persistent else None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @property
+    def embedding_function(self) -> Callable:
+        """The wrapped embedding function, loading the model on first access."""
+        if self._embedding_function is None:
+            with self._load_lock:
+                if self._embedding_function is None:
+                    self._embedding_function = self._factory()
+        return self._embedding_function
+
+    @property
+    def loaded(self) -> bool:
+        return self._embedding_function is not None
+
+    def load(self):
+        """Load the wrapped model now instead of on the first cache miss."""
+        return self.embedding_function
+
+    def __call__(self, texts):
+        """
+        Generate embeddings for the given texts, computing only the ones not cached yet.
+
+        Args:
+            texts: List of text strings to embed
+
+        Returns:
+            numpy.ndarray: Array of embeddings
+        """
+        texts = list(texts)
+        keys = [text_key(self.model_name, text) for text in texts]
+        vectors: List[Optional[np.ndarray]] = [self._get(key) for key in keys]
+
+        # Embed each distinct missing text once, even if it appears several times in the batch
+        missing: Dict[str, List[int]] = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(keys[i], []).append(i)
+        if missing:
+            missing_keys = list(missing.keys())
+            computed = np.asarray(
+                self.embedding_function([texts[missing[key][0]] for key in missing_keys]),
+                dtype=np.float32
+            )
+            with self._lock:
+                self.misses += len(missing_keys)
+            for key, vector in zip(missing_keys, computed):
+                self._put_memory(key, vector)
+                for i in missing[key]:
+                    vectors[i] = vector
+            if self.disk is not None:
+                self.disk.put_many(missing_keys, computed)
+
+        if not vectors:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack(vectors)
+
+    def _get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return vector
+        if self.disk is not None:
+            vector = self.disk.get(key)
+            if vector is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                self._put_memory(key, vector)
+                return vector
+        return None
+
+    def _put_memory(self, key: str, vector: np.ndarray):
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_items:
+                self._memory.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and tier sizes."""
+        with self._lock:
+            return {
+                "model_name": self.model_name,
+                "loaded": self.loaded,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_items": len(self._memory),
+                "disk_items": len(self.disk) if self.disk is not None else 0,
+            }
+
+
+_cached_functions: Dict[str, CachedEmbeddingFunction] = {}
+_registry_lock = threading.Lock()
+
+
+def get_cached_embedding_function(model_name: str, factory: Callable[[], Callable]) -> CachedEmbeddingFunction:
+    """
+    Return the process-wide cached embedding function for model_name. The wrapped model is
+    created with factory on first use, and every collection using the same model shares it.
+    """
+    with _registry_lock:
+        if model_name not in _cached_functions:
+            _cached_functions[model_name] = CachedEmbeddingFunction(factory, model_name)
+        return _cached_functions[model_name]
+
+
+def embedding_cache_stats() -> List[Dict[str, int]]:
+    with _registry_lock:
+        return [cached.stats() for cached in _cached_functions.values()]
@@ -0,0 +1,190 @@
+import os
+import time
+import asyncio
+import functools
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+TOOL_EXECUTOR_WORKERS = int(os.getenv("TOOL_EXECUTOR_WORKERS", "16"))
+TOOL_DEFAULT_CONCURRENCY = int(os.getenv("TOOL_DEFAULT_CONCURRENCY", "4"))
+# Calls allowed to wait for a slot per tool; further calls are rejected right away
+TOOL_QUEUE_LIMIT = int(os.getenv("TOOL_QUEUE_LIMIT", "32"))
+CPU_EXECUTOR_WORKERS = int(os.getenv("CPU_EXECUTOR_WORKERS", str(min(os.cpu_count() or 4, 8))))
+
+# Concurrent calls per tool, overridable with TOOL_CONCURRENCY_<NAME>
+DEFAULT_TOOL_CONCURRENCY: Dict[str, int] = {
+    "google_search": 4,
+    "fetch_web": 8,
+    "get_weather": 4,
+    "doc_retriever": 4,
+}
+
+
+class ToolRejected(RuntimeError):
+    """Raised when a tool's wait queue is full, so the call is refused instead of queued."""
+
+
+class _WaitStats:
+    """Queue and wait-time counters of one lane (a tool or the CPU pool)."""
+    def __init__(self, window: int = 512):
+        self.waiting = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self._waits: Deque[float] = deque(maxlen=window)
+
+    def record_wait(self, seconds: float):
+        self._waits.append(seconds * 1000)
+
+    def snapshot(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+        return {
+            "queue_depth": self.waiting,
+            "running": self.running,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "wait_ms_avg": round(sum(waits) / len(waits), 2) if waits else 0.0,
+            "wait_ms_p95": round(waits[min(int(len(waits) * 0.95), len(waits) - 1)], 2) if waits else 0.0,
+            "wait_ms_max": round(waits[-1], 2) if waits else 0.0,
+        }
+
+
+class _ToolLane:
+    def __init__(self, concurrency: int, queue_limit: int):
+        self.concurrency = concurrency
+        self.queue_limit = queue_limit
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.stats = _WaitStats()
+
+
+class ToolExecutor:
+    """
+    Runs tool calls in isolation from the rest of the application.
+    Every tool has its own semaphore and a bounded wait queue, so a burst of one tool can
+    neither starve another tool nor pile up unbounded work; calls beyond the queue limit
+    raise ToolRejected. Synchronous tools run on a dedicated thread pool instead of the
+    default executor shared with Chroma and database calls.
+    """
+    def __init__(
+        self,
+        workers: int = TOOL_EXECUTOR_WORKERS,
+        concurrency: Optional[Dict[str, int]] = None,
+        default_concurrency: int = TOOL_DEFAULT_CONCURRENCY,
+        queue_limit: int = TOOL_QUEUE_LIMIT
+    ):
+        self.concurrency = dict(DEFAULT_TOOL_CONCURRENCY if concurrency is None else concurrency)
+        self.default_concurrency = default_concurrency
+        self.queue_limit = queue_limit
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tool")
+        self._lanes: Dict[str, _ToolLane] = {}
+
+    def _lane(self, tool_name: str) -> _ToolLane:
+        lane = self._lanes.get(tool_name)
+        if lane is None:
+            default = self.concurrency.get(tool_name, self.default_concurrency)
+            concurrency = int(os.getenv(f"TOOL_CONCURRENCY_{tool_name.upper()}", str(default)))
+            lane = self._lanes[tool_name] = _ToolLane(concurrency, self.queue_limit)
+        return lane
+
+    async def run(self, tool_name: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Run a tool function under its tool's concurrency limit.
+        Coroutine functions are awaited on the event loop, plain functions run on the tool pool.
+
+        Raises:
+            ToolRejected: If too many calls of this tool are already waiting.
+        """
+        lane = self._lane(tool_name)
+        if lane.semaphore.locked() and lane.stats.waiting >= lane.queue_limit:
+            lane.stats.rejected += 1
+            raise ToolRejected(f"Tool '{tool_name}' is overloaded, {lane.stats.waiting} calls are already waiting")
+
+        queued_at = time.monotonic()
+        lane.stats.waiting += 1
+        try:
+            await lane.semaphore.acquire()
+        finally:
+            lane.stats.waiting -= 1
+        lane.stats.record_wait(time.monotonic() - queued_at)
+
+        lane.stats.running += 1
+        try:
+            if asyncio.iscoroutinefunction(func):
+                return await func(*args, **kwargs)
+            return await self.run_in_pool(func, *args, **kwargs)
+        finally:
+            lane.stats.running -= 1
+            lane.stats.completed += 1
+            lane.semaphore.release()
+
+    async def run_in_pool(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """
+        Run a blocking call on the tool pool without taking a slot, for async tools that
+        already hold their tool's slot and call a synchronous client.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, functools.partial(func, *args, **kwargs))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            name: {"concurrency": lane.concurrency, "queue_limit": lane.queue_limit, **lane.stats.snapshot()}
+            for name, lane in self._lanes.items()
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class CPUExecutor:
+    """
+    Thread pool reserved for CPU-heavy work (embedding, HTML parsing), so it never
+    competes with I/O-bound calls for the default executor.
+    """
+    def __init__(self, workers: int = CPU_EXECUTOR_WORKERS):
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="cpu")
+        self._stats = _WaitStats()
+        self._lock = threading.Lock()
+        self._in_flight = 0  # queued + running, only touched on the event loop
+
+    def _timed(self, func: Callable[[], T], submitted_at: float) -> T:
+        with self._lock:
+            self._stats.record_wait(time.monotonic() - submitted_at)
+            self._stats.running += 1
+        try:
+            return func()
+        finally:
+            with self._lock:
+                self._stats.running -= 1
+                self._stats.completed += 1
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        """Run a blocking function on the CPU pool and await its result."""
+        loop = asyncio.get_running_loop()
+        call = functools.partial(func, *args, **kwargs)
+        self._in_flight += 1
+        try:
+            return await loop.run_in_executor(self._pool, self._timed, call, time.monotonic())
+        finally:
+            self._in_flight -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._stats.waiting = max(self._in_flight - self._stats.running, 0)
+            return {"workers": self.workers, **self._stats.snapshot()}
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+tool_executor = ToolExecutor()
+cpu_executor = CPUExecutor()
+
+
+def run_cpu(func: Callable[..., T], *args, **kwargs) -> Awaitable[T]:
+    """Shortcut for cpu_executor.run."""
+    return cpu_executor.run(func, *args, **kwargs)
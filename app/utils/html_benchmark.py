@@ -0,0 +1,65 @@
+import time
+import argparse
+import statistics
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from app.utils.html_process import HTMLProcessor, extract_html, etree
+
+
+def load_corpus(pages_dir: Path) -> List[str]:
+    """Read every saved .html / .htm page of a directory."""
+    pages = []
+    for path in sorted(pages_dir.iterdir()):
+        if path.suffix.lower() in (".html", ".htm"):
+            pages.append(path.read_text(encoding="utf-8", errors="replace"))
+    return pages
+
+
+def time_extractor(extract: Callable[[str], object], pages: List[str], repeat: int) -> Dict[str, float]:
+    """Run an extractor over the corpus and return per-page timings in milliseconds."""
+    timings = []
+    for _ in range(repeat):
+        for page in pages:
+            start = time.perf_counter()
+            extract(page)
+            timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "mean_ms": statistics.mean(timings),
+        "p50_ms": statistics.median(timings),
+        "max_ms": max(timings),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare HTML extraction engines on a corpus of saved pages.")
+    parser.add_argument("pages_dir", type=Path, help="Directory of saved .html pages")
+    parser.add_argument("--repeat", type=int, default=5, help="Passes over the corpus per engine")
+    parser.add_argument("--budget", type=int, default=2000, help="Character budget of the streaming extractors")
+    args = parser.parse_args()
+
+    pages = load_corpus(args.pages_dir)
+    if not pages:
+        print(f"No .html pages found in {args.pages_dir}")
+        return
+    print(f"{len(pages)} pages, {sum(len(page) for page in pages) / len(pages) / 1024:.1f} KiB on average")
+
+    engines: Dict[str, Callable[[str], object]] = {}
+    try:
+        import bs4  # noqa: F401
+        engines["beautifulsoup"] = lambda page: HTMLProcessor().process_html(page)
+    except ImportError:
+        print("beautifulsoup4 is not installed, skipping the baseline")
+    engines["stdlib"] = lambda page: extract_html(page, budget=args.budget, backend="stdlib")
+    if etree is not None:
+        engines["lxml"] = lambda page: extract_html(page, budget=args.budget, backend="lxml")
+
+    results = {name: time_extractor(extract, pages, args.repeat) for name, extract in engines.items()}
+    baseline = results.get("beautifulsoup", {}).get("mean_ms")
+    for name, result in results.items():
+        speedup = f"  x{baseline / result['mean_ms']:.1f}" if baseline else ""
+        print(f"{name:>14}: mean {result['mean_ms']:.2f} ms  p50 {result['p50_ms']:.2f} ms  max {result['max_ms']:.2f} ms{speedup}")
+
+
+if __name__ == "__main__":
+    main()
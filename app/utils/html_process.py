@@ -1,7 +1,8 @@
+import os
 import re
 import html
+from html.parser import HTMLParser
 from typing import Dict, Any, List, Optional
-from bs4 import BeautifulSoup
 import logging
 
 logger = logging.getLogger(__name__)
@@ -37,6 +38,9 @@ class HTMLProcessor:
             return self._empty_result()
         
         try:
+            # BeautifulSoup is only needed by this full-tree processor
+            from bs4 import BeautifulSoup
+
             # Parse the HTML
             self.soup = BeautifulSoup(html_content, 'html.parser')
             
@@ -124,19 +128,226 @@ class HTMLProcessor:
         }
 
 
-def process_html_content(html_content: str) -> str:
+HTML_PARSER_BACKEND = os.getenv("HTML_PARSER_BACKEND", "auto")  # auto | lxml | stdlib
+# Pages are only parsed up to this many characters, whatever the budget
+HTML_MAX_INPUT_CHARS = int(os.getenv("HTML_MAX_INPUT_CHARS", str(1024 * 1024)))
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+
+class _ExtractionHandler:
     """
-    Process HTML content and extract useful information.
-    
-    Args:
-        html_content: Raw HTML content as a string
-        
-    Returns:
-        String containing the concatenated title, description, and main content.
+    Parser-agnostic, single-pass main-content heuristic driven by start / end / data events.
+    Text of the first main-content region (article, main or a common content id/class) is
+    collected separately from the rest of the page, so parsing can stop as soon as enough
+    main content - or, failing that, enough page text - has been seen.
+    """
+
+    SKIP_TAGS = {'script', 'style', 'nav', 'header', 'footer', 'noscript', 'svg', 'template'}
+    MAIN_TAGS = {'article', 'main'}
+    MAIN_NAMES = {'main-content', 'content', 'post-content', 'entry-content'}
+    # Without main content, read this many times the budget of page text before giving up on finding it
+    BODY_BUDGET_FACTOR = 4
+
+    def __init__(self, budget: int):
+        self.budget = budget
+        self.title = ""
+        self.description = ""
+        self._in_title = False
+        self._skip: List[list] = []  # [tag, depth] of the suppressed region
+        self._main_tag: Optional[str] = None
+        self._main_depth = 0
+        self._main_closed = False
+        self._main_parts: List[str] = []
+        self._body_parts: List[str] = []
+        self._main_len = 0
+        self._body_len = 0
+
+    @property
+    def done(self) -> bool:
+        if self._main_len >= self.budget or (self._main_closed and self._main_len > 0):
+            return True
+        return self._main_len == 0 and self._body_len >= self.budget * self.BODY_BUDGET_FACTOR
+
+    def _is_main(self, tag: str, attrs: Dict[str, Optional[str]]) -> bool:
+        if tag in self.MAIN_TAGS:
+            return True
+        classes = set((attrs.get('class') or '').split())
+        return attrs.get('id') in self.MAIN_NAMES or bool(classes & self.MAIN_NAMES)
+
+    def _break(self):
+        if self._body_parts and self._body_parts[-1] != " ":
+            self._body_parts.append(" ")
+        if self._main_parts and self._main_parts[-1] != " ":
+            self._main_parts.append(" ")
+
+    def start(self, tag: str, attrs: Dict[str, Optional[str]]):
+        self._break()
+        if self._skip:
+            if tag == self._skip[-1][0]:
+                self._skip[-1][1] += 1
+            return
+        if tag in self.SKIP_TAGS:
+            self._skip.append([tag, 1])
+            return
+        if tag == 'title':
+            self._in_title = True
+        elif tag == 'meta' and not self.description:
+            if attrs.get('name') == 'description' or attrs.get('property') == 'og:description':
+                self.description = (attrs.get('content') or '').strip()
+        elif self._main_tag is not None and not self._main_closed:
+            if tag == self._main_tag:
+                self._main_depth += 1
+        elif self._main_tag is None and self._is_main(tag, attrs):
+            self._main_tag = tag
+            self._main_depth = 1
+
+    def end(self, tag: str):
+        self._break()
+        if self._skip:
+            if tag == self._skip[-1][0]:
+                self._skip[-1][1] -= 1
+                if self._skip[-1][1] == 0:
+                    self._skip.pop()
+            return
+        if tag == 'title':
+            self._in_title = False
+        elif self._main_tag == tag and not self._main_closed:
+            self._main_depth -= 1
+            if self._main_depth == 0:
+                self._main_closed = True
+
+    def data(self, data: str):
+        if self._skip:
+            return
+        if self._in_title:
+            self.title += data
+            return
+        # Text nodes may be split across feed() calls, so raw data is kept and
+        # separators are only added at tag boundaries (see _break)
+        size = len(data.strip())
+        self._body_parts.append(data)
+        self._body_len += size
+        if self._main_tag is not None and not self._main_closed:
+            self._main_parts.append(data)
+            self._main_len += size
+
+    def close(self):
+        pass
+
+    def result(self) -> Dict[str, Any]:
+        """Return the extracted information in the same shape as HTMLProcessor.process_html."""
+        if self._main_parts:
+            main_content = re.sub(r'\s+', ' ', "".join(self._main_parts)).strip()
+        else:
+            main_content = re.sub(r'\s+', ' ', "".join(self._body_parts)).strip()[:self.budget]
+        return {
+            "title": re.sub(r'\s+', ' ', self.title).strip(),
+            "description": self.description,
+            "main_content": main_content
+        }
+
+
+class _StdlibHTMLParser(HTMLParser):
+    """Pure-Python tokenizer forwarding events to an _ExtractionHandler."""
+    def __init__(self, handler: _ExtractionHandler):
+        super().__init__(convert_charrefs=True)
+        self.handler = handler
+
+    def handle_starttag(self, tag, attrs):
+        self.handler.start(tag, dict(attrs))
+
+    def handle_endtag(self, tag):
+        self.handler.end(tag)
+
+    def handle_data(self, data):
+        self.handler.data(data)
+
+
+class _LxmlTarget:
+    """lxml parser target; lxml passes tags already lower-cased and attributes as a dict."""
+    def __init__(self, handler: _ExtractionHandler):
+        self.handler = handler
+
+    def start(self, tag, attrib):
+        if isinstance(tag, str):
+            self.handler.start(tag, dict(attrib))
+
+    def end(self, tag):
+        if isinstance(tag, str):
+            self.handler.end(tag)
+
+    def data(self, data):
+        self.handler.data(data)
+
+    def close(self):
+        return None
+
+
+class StreamingHTMLExtractor:
+    """
+    Incremental text extractor for HTML that arrives in chunks.
+    Uses lxml's C parser when it is installed, the standard library parser otherwise,
+    and stops accepting input once the character budget or HTML_MAX_INPUT_CHARS is reached.
+    """
+    def __init__(self, budget: int = 2000, backend: str = HTML_PARSER_BACKEND, max_input_chars: int = HTML_MAX_INPUT_CHARS):
+        self.handler = _ExtractionHandler(budget)
+        self.max_input_chars = max_input_chars
+        self._fed = 0
+        if backend == "auto":
+            backend = "lxml" if etree is not None else "stdlib"
+        if backend == "lxml" and etree is None:
+            logger.warning("lxml is not installed, falling back to the stdlib HTML parser")
+            backend = "stdlib"
+        self.backend = backend
+        if backend == "lxml":
+            self._parser = etree.HTMLParser(target=_LxmlTarget(self.handler), recover=True, no_network=True)
+        else:
+            self._parser = _StdlibHTMLParser(self.handler)
+
+    @property
+    def done(self) -> bool:
+        return self.handler.done or self._fed >= self.max_input_chars
+
+    def feed(self, data: str):
+        if self.done or not data:
+            return
+        data = data[:self.max_input_chars - self._fed]
+        self._fed += len(data)
+        self._parser.feed(data)
+
+    def close(self):
+        try:
+            self._parser.close()
+        except Exception as e:
+            # lxml raises on documents it could not make sense of; keep what was extracted
+            logger.debug(f"Error closing HTML parser: {str(e)}")
+
+    def result(self) -> Dict[str, Any]:
+        return self.handler.result()
+
+
+def extract_html(html_content: str, budget: int = 2000, chunk_size: int = 16384, **kwargs) -> Dict[str, Any]:
+    """
+    Extract title, description and main content from a complete HTML string,
+    feeding it in chunks so parsing stops early once the budget is reached.
+    """
+    extractor = StreamingHTMLExtractor(budget=budget, **kwargs)
+    for start in range(0, len(html_content), chunk_size):
+        extractor.feed(html_content[start:start + chunk_size])
+        if extractor.done:
+            break
+    extractor.close()
+    return extractor.result()
+
+
+def format_html_result(result_dict: Dict[str, Any]) -> str:
+    """
+    Concatenate the title, description, and main content of an extraction result.
     """
-    processor = HTMLProcessor()
-    result_dict = processor.process_html(html_content)
-    
     concatenated_text = ""
     
     if result_dict["title"]:
@@ -150,3 +361,16 @@ def process_html_content(html_content: str) -> str:
     
     return concatenated_text.strip()
 
+
+def process_html_content(html_content: str, budget: int = 2000) -> str:
+    """
+    Process HTML content and extract useful information.
+    
+    Args:
+        html_content: Raw HTML content as a string
+        budget: Number of main-content characters after which parsing stops
+        
+    Returns:
+        String containing the concatenated title, description, and main content.
+    """
+    return format_html_result(extract_html(html_content, budget=budget))
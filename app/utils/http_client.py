@@ -0,0 +1,88 @@
+import os
+import json
+import codecs
+import asyncio
+from typing import Any, AsyncIterator, Dict, Optional
+
+import aiohttp
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+HTTP_TOTAL_TIMEOUT = float(os.getenv("HTTP_TOTAL_TIMEOUT", "20"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "8"))
+HTTP_MAX_RESPONSE_BYTES = int(os.getenv("HTTP_MAX_RESPONSE_BYTES", str(2 * 1024 * 1024)))
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+_session: Optional[aiohttp.ClientSession] = None
+_session_lock = asyncio.Lock()
+
+
+async def get_session() -> aiohttp.ClientSession:
+    """
+    Return the shared client session, created on first use inside the running event loop.
+    Connections are kept alive and pooled, with a per-host limit so one slow site
+    cannot take every connection.
+    """
+    global _session
+    if _session is None or _session.closed:
+        async with _session_lock:
+            if _session is None or _session.closed:
+                _session = aiohttp.ClientSession(
+                    connector=aiohttp.TCPConnector(
+                        limit=HTTP_MAX_CONNECTIONS,
+                        limit_per_host=HTTP_MAX_CONNECTIONS_PER_HOST,
+                        ttl_dns_cache=300
+                    ),
+                    timeout=aiohttp.ClientTimeout(
+                        total=HTTP_TOTAL_TIMEOUT,
+                        connect=HTTP_CONNECT_TIMEOUT,
+                        sock_read=HTTP_READ_TIMEOUT
+                    ),
+                    headers=DEFAULT_HEADERS
+                )
+    return _session
+
+
+async def close_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+async def iter_response_text(
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    max_bytes: int = HTTP_MAX_RESPONSE_BYTES,
+    chunk_size: int = 16384
+) -> AsyncIterator[str]:
+    """
+    Stream the decoded body of a GET request.
+    Reading stops after max_bytes, and the caller may stop earlier; wrap the iterator in
+    contextlib.aclosing so an early exit releases the connection right away.
+
+    Raises:
+        aiohttp.ClientResponseError: If the response status is an error.
+    """
+    session = await get_session()
+    async with session.get(url, params=params, headers=headers) as response:
+        response.raise_for_status()
+        decoder = codecs.getincrementaldecoder(response.charset or "utf-8")(errors="replace")
+        read = 0
+        async for chunk in response.content.iter_chunked(chunk_size):
+            read += len(chunk)
+            yield decoder.decode(chunk)
+            if read >= max_bytes:
+                break
+        yield decoder.decode(b"", final=True)
+
+
+async def fetch_json(url: str, params: Optional[Dict[str, Any]] = None, max_bytes: int = HTTP_MAX_RESPONSE_BYTES) -> Any:
+    """GET a JSON document through the shared session."""
+    parts = [part async for part in iter_response_text(url, params=params, max_bytes=max_bytes)]
+    return json.loads("".join(parts))
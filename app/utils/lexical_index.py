@@ -0,0 +1,121 @@
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable, List, Dict, Optional, Sequence
+
+_TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into the word tokens FTS5's unicode61 tokenizer also produces."""
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over document chunks, stored in an SQLite FTS5 table next to the Chroma data.
+    A companion table maps Chroma chunk ids and sources to FTS rowids, so chunks can be
+    replaced or removed incrementally without rebuilding the index.
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS chunk_ids (
+                rowid INTEGER PRIMARY KEY,
+                id TEXT UNIQUE NOT NULL,
+                source TEXT
+            );
+            CREATE INDEX IF NOT EXISTS ix_chunk_ids_source ON chunk_ids (source);
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5(text);
+            CREATE TABLE IF NOT EXISTS index_version (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL);
+            INSERT OR IGNORE INTO index_version (id, version) VALUES (1, 0);
+        ''')
+        self._conn.commit()
+
+    def _bump_version(self):
+        self._conn.execute("UPDATE index_version SET version = version + 1 WHERE id = 1")
+
+    def version(self) -> int:
+        """
+        Counter incremented on every change to the indexed chunks, shared by all processes
+        using this file, so caches can tell when the document collection changed.
+        """
+        with self._lock:
+            return self._conn.execute("SELECT version FROM index_version WHERE id = 1").fetchone()[0]
+
+    def _delete_rowids(self, rowids: List[int]):
+        if not rowids:
+            return
+        placeholders = ",".join("?" * len(rowids))
+        self._conn.execute(f"DELETE FROM chunks WHERE rowid IN ({placeholders})", rowids)
+        self._conn.execute(f"DELETE FROM chunk_ids WHERE rowid IN ({placeholders})", rowids)
+
+    def add(self, ids: Sequence[str], texts: Sequence[str], sources: Sequence[str]):
+        """Insert or replace chunks."""
+        if not ids:
+            return
+        with self._lock:
+            placeholders = ",".join("?" * len(ids))
+            existing = [row[0] for row in self._conn.execute(
+                f"SELECT rowid FROM chunk_ids WHERE id IN ({placeholders})", list(ids)
+            )]
+            self._delete_rowids(existing)
+            for chunk_id, text, source in zip(ids, texts, sources):
+                cursor = self._conn.execute("INSERT INTO chunk_ids (id, source) VALUES (?, ?)", (chunk_id, source))
+                self._conn.execute("INSERT INTO chunks (rowid, text) VALUES (?, ?)", (cursor.lastrowid, text))
+            self._bump_version()
+            self._conn.commit()
+
+    def delete_source(self, source: str, keep: Optional[Callable[[str], bool]] = None):
+        """Remove every chunk of a source file, except the chunks whose id satisfies keep."""
+        with self._lock:
+            rows = self._conn.execute("SELECT rowid, id FROM chunk_ids WHERE source = ?", (source,)).fetchall()
+            self._delete_rowids([rowid for rowid, chunk_id in rows if keep is None or not keep(chunk_id)])
+            self._bump_version()
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.execute("DELETE FROM chunk_ids")
+            self._bump_version()
+            self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunk_ids").fetchone()[0]
+
+    def search(self, query: str, limit: int = 20) -> List[str]:
+        """
+        Return chunk ids ranked by BM25 for any of the query terms.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        # Quote every term so FTS5 operators in user input are taken literally
+        match = " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        with self._lock:
+            rows = self._conn.execute('''
+                SELECT chunk_ids.id FROM chunks
+                JOIN chunk_ids ON chunk_ids.rowid = chunks.rowid
+                WHERE chunks MATCH ?
+                ORDER BY bm25(chunks)
+                LIMIT ?
+            ''', (match, limit)).fetchall()
+        return [row[0] for row in rows]
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> Dict[str, float]:
+    """
+    Fuse several ranked id lists: every list contributes 1 / (k + rank) for each id it contains.
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return scores
@@ -1,10 +1,22 @@
 import os
+import json
+import time
+import hashlib
+import argparse
+import threading
+import multiprocessing
+import queue
+import bisect
+from concurrent.futures import ProcessPoolExecutor
 import PyPDF2
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from typing import Callable, List, Dict, Any, Set, Tuple, Optional, Iterator, Iterable
 
 import chromadb
 from chromadb.utils import embedding_functions
+from app.utils.embedding_cache import get_cached_embedding_function, CachedEmbeddingFunction
+from app.utils.resources import get_chroma_client, register_warmup
+from app.utils.lexical_index import LexicalIndex
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
 
@@ -13,27 +25,59 @@ db_dir_path = Path("data/chromadb")
 collection_name = "pdf_collection"
 chunk_size = 1000
 chunk_overlap = 200
+embed_batch_size = 64
+manifest_file_name = "pdf_manifest.json"
+lexical_index_file_name = "pdf_lexical_index.db"
+
+# Current splitter parameters, shipped to the extraction worker processes
+splitter_settings = {"chunk_size": chunk_size, "chunk_overlap": chunk_overlap}
 
 # Create directories if they don't exist
 os.makedirs(pdf_dir_path, exist_ok=True)
 os.makedirs(db_dir_path, exist_ok=True)
 
-# Initialize ChromaDB client and embedding function at the module level
-client = chromadb.PersistentClient(path=str(db_dir_path))
-embedding_function = embedding_functions.SentenceTransformerEmbeddingFunction(
-    model_name="all-MiniLM-L6-v2"
+# Shared embedding function; the model is loaded on first use or during warm-up
+embedding_function = get_cached_embedding_function(
+    "all-MiniLM-L6-v2",
+    lambda: embedding_functions.SentenceTransformerEmbeddingFunction(model_name="all-MiniLM-L6-v2")
 )
 
-# Create or get collection at the module level
-collection = client.get_or_create_collection(
-    name=collection_name,
-    embedding_function=embedding_function
-)
+# ChromaDB client and collection are resolved lazily by get_collection()
+client = None
+collection = None
+lexical_index = None
+_collection_lock = threading.Lock()
+
+def get_collection() -> chromadb.Collection:
+    """Get the PDF collection, creating the client and collection on first use."""
+    global client, collection
+    if collection is None:
+        with _collection_lock:
+            if collection is None:
+                client = get_chroma_client(str(db_dir_path))
+                collection = client.get_or_create_collection(
+                    name=collection_name,
+                    embedding_function=embedding_function
+                )
+    return collection
+
+def get_lexical_index() -> LexicalIndex:
+    """Get the BM25 index kept alongside the PDF collection."""
+    global lexical_index
+    if lexical_index is None:
+        with _collection_lock:
+            if lexical_index is None:
+                lexical_index = LexicalIndex(db_dir_path / lexical_index_file_name)
+    return lexical_index
+
+register_warmup("pdf_embedding", embedding_function.load)
+register_warmup("pdf_collection", get_collection)
 
 # Initialize text splitter for chunking at the module level
 text_splitter = RecursiveCharacterTextSplitter(
     chunk_size=chunk_size,
-    chunk_overlap=chunk_overlap
+    chunk_overlap=chunk_overlap,
+    add_start_index=True
 )
 
 def initialize_pdf_processor(
@@ -42,7 +86,7 @@ def initialize_pdf_processor(
     collection_name: str = "pdf_collection",
     chunk_size: int = 1000,
     chunk_overlap: int = 200
-) -> Tuple[chromadb.Collection, embedding_functions.SentenceTransformerEmbeddingFunction]:
+) -> Tuple[chromadb.Collection, CachedEmbeddingFunction]:
     """
     Re-initialize the PDF processor components with new parameters
     
@@ -56,7 +100,7 @@ def initialize_pdf_processor(
     Returns:
         Tuple containing the collection and embedding function
     """
-    global client, embedding_function, collection, text_splitter
+    global client, embedding_function, collection, text_splitter, lexical_index
     global pdf_dir_path, db_dir_path
     
     # Update paths
@@ -68,7 +112,8 @@ def initialize_pdf_processor(
     os.makedirs(db_dir_path, exist_ok=True)
     
     # Re-initialize client with new parameters
-    client = chromadb.PersistentClient(path=str(db_dir_path))
+    client = get_chroma_client(str(db_dir_path))
+    lexical_index = LexicalIndex(db_dir_path / lexical_index_file_name)
     
     # No need to recreate the embedding function unless model changes
     
@@ -79,26 +124,89 @@ def initialize_pdf_processor(
     )
     
     # Update text splitter with new parameters
+    splitter_settings.update(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap
+        chunk_overlap=chunk_overlap,
+        add_start_index=True
     )
     
     return collection, embedding_function
 
+def iter_pdf_pages(pdf_path: Path) -> Iterator[Tuple[int, str]]:
+    """
+    Yield (page_number, text) for each page of a PDF, starting at 1.
+    Pages are parsed one at a time, so only the current page is held in memory.
+    """
+    with open(pdf_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        for page_number, page in enumerate(reader.pages, start=1):
+            yield page_number, page.extract_text() or ""
+
 def extract_text_from_pdf(pdf_path: Path) -> str:
     """Extract text from a PDF file."""
-    text = ""
     try:
-        with open(pdf_path, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-        return text
+        # Join once instead of growing a string page by page
+        return "\n".join(text for _, text in iter_pdf_pages(pdf_path))
     except Exception as e:
         print(f"Error extracting text from {pdf_path}: {e}")
         return ""
 
+def stream_chunks(
+    pages: Iterable[Tuple[int, str]],
+    metadata: Dict[str, Any],
+    splitter: Optional[RecursiveCharacterTextSplitter] = None
+) -> Iterator[Dict[str, Any]]:
+    """
+    Split a stream of pages into chunks, carrying text (and so the overlap) across page boundaries.
+    Each chunk gets `page` and `page_end` metadata for the first and last page it covers.
+    Only the unfinished tail of the text is buffered, so memory stays bounded by a few pages.
+    """
+    splitter = splitter or text_splitter
+    # Keep at least two chunks worth of text before splitting so chunk boundaries match a full-text split
+    threshold = 2 * splitter._chunk_size
+    buffer = ""
+    page_offsets: List[int] = []  # start offset of each buffered page in buffer
+    page_numbers: List[int] = []
+    chunk_id = 0
+
+    def page_at(offset: int) -> int:
+        return page_numbers[max(bisect.bisect_right(page_offsets, offset) - 1, 0)]
+
+    def split(final: bool):
+        nonlocal buffer, page_offsets, page_numbers, chunk_id
+        documents = splitter.create_documents([buffer])
+        if not final:
+            # The last chunk may still grow with the next page, it is carried over instead
+            documents, carry = documents[:-1], documents[-1:]
+        for doc in documents:
+            start = doc.metadata["start_index"]
+            yield {
+                "text": doc.page_content,
+                "metadata": {
+                    **metadata,
+                    "chunk_id": chunk_id,
+                    "page": page_at(start),
+                    "page_end": page_at(start + max(len(doc.page_content) - 1, 0)),
+                },
+            }
+            chunk_id += 1
+        if not final:
+            cut = carry[0].metadata["start_index"] if carry else len(buffer)
+            first_page = max(bisect.bisect_right(page_offsets, cut) - 1, 0)
+            page_offsets = [max(offset - cut, 0) for offset in page_offsets[first_page:]]
+            page_numbers = page_numbers[first_page:]
+            buffer = buffer[cut:]
+
+    for page_number, page_text in pages:
+        page_offsets.append(len(buffer))
+        page_numbers.append(page_number)
+        buffer += page_text + "\n"
+        if len(buffer) >= threshold:
+            yield from split(final=False)
+    if buffer.strip():
+        yield from split(final=True)
+
 def chunk_text(text: str, metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
     """Split text into chunks."""
     chunks = text_splitter.split_text(text)
@@ -113,53 +221,334 @@ def chunk_text(text: str, metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
     
     return documents
 
+def file_hash(pdf_path: Path) -> str:
+    """SHA-256 of a file's content, read in blocks."""
+    digest = hashlib.sha256()
+    with open(pdf_path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def chunk_id_for(metadata: Dict[str, Any]) -> str:
+    # The content hash keeps ids unique across files with the same name and across file versions
+    return f"{metadata['filename']}_{metadata['content_hash'][:12]}_{metadata['chunk_id']}"
+
 def add_to_collection(documents: List[Dict[str, Any]]):
     """Add documents to ChromaDB collection."""
     if not documents:
         return
     
-    ids = [f"{doc['metadata']['filename']}_{doc['metadata']['chunk_id']}" for doc in documents]
+    ids = [chunk_id_for(doc['metadata']) for doc in documents]
     texts = [doc["text"] for doc in documents]
     metadatas = [doc["metadata"] for doc in documents]
     
-    # Add documents to collection
-    collection.add(
+    # Upsert so re-ingesting the same file version does not collide on ids
+    get_collection().upsert(
         ids=ids,
         documents=texts,
         metadatas=metadatas
     )
+    get_lexical_index().add(ids, texts, [metadata["source"] for metadata in metadatas])
+
+def delete_source(source: str):
+    """Remove every chunk of a source file from the collection and the BM25 index."""
+    get_collection().delete(where={"source": source})
+    get_lexical_index().delete_source(source)
+
+def _delete_source_chunks(source: str, keep: Callable[[str], bool]):
+    """Remove the chunks of a source whose id does not satisfy keep, from the collection and the BM25 index."""
+    collection = get_collection()
+    ids = collection.get(where={"source": source}, include=[])["ids"]
+    stale = [chunk_id for chunk_id in ids if not keep(chunk_id)]
+    if stale:
+        collection.delete(ids=stale)
+    get_lexical_index().delete_source(source, keep=keep)
+
+def _version_prefix(source: str, content_hash: str) -> str:
+    return chunk_id_for({"filename": Path(source).name, "content_hash": content_hash, "chunk_id": ""})
+
+def delete_stale_chunks(source: str, content_hash: str, chunk_count: int):
+    """
+    Remove every chunk of a source that is not part of its current version: chunks of other
+    file versions, and trailing chunks of this version left by an earlier, longer split.
+    Called once the new chunks are written, so the file stays searchable while it is re-ingested.
+    """
+    prefix = _version_prefix(source, content_hash)
+
+    def current(chunk_id: str) -> bool:
+        index = chunk_id[len(prefix):]
+        return chunk_id.startswith(prefix) and index.isdigit() and int(index) < chunk_count
+
+    _delete_source_chunks(source, current)
+
+def delete_version_chunks(source: str, content_hash: str):
+    """Remove the chunks of one version of a source, e.g. the partial output of a failed run."""
+    prefix = _version_prefix(source, content_hash)
+    _delete_source_chunks(source, lambda chunk_id: not chunk_id.startswith(prefix))
+
+def rebuild_lexical_index(batch_size: int = 1000):
+    """Rebuild the BM25 index from the chunks already stored in the collection."""
+    index = get_lexical_index()
+    index.clear()
+    collection = get_collection()
+    total = collection.count()
+    for offset in range(0, total, batch_size):
+        batch = collection.get(offset=offset, limit=batch_size, include=["documents", "metadatas"])
+        index.add(
+            batch["ids"],
+            batch["documents"],
+            [(metadata or {}).get("source", "") for metadata in batch["metadatas"]]
+        )
+    print(f"Rebuilt lexical index with {index.count()} chunks")
+
+# Queue the extraction workers send chunk batches through, set by the pool initializer
+_worker_queue = None
+
+def _init_worker(chunk_queue):
+    global _worker_queue
+    _worker_queue = chunk_queue
+
+def _extract_and_chunk(pdf_path: str, content_hash: str, settings: Dict[str, int], batch_size: int):
+    """
+    Extraction worker: runs in a separate process, so it builds its own splitter.
+    Chunks are sent to the parent in batches through a bounded queue as pages are read,
+    so neither process ever holds a whole document.
+    """
+    path = Path(pdf_path)
+    source = str(path)
+    try:
+        splitter = RecursiveCharacterTextSplitter(**settings, add_start_index=True)
+        metadata = {"filename": path.name, "source": source, "content_hash": content_hash}
+        _worker_queue.put(("start", source, None))
+        batch = []
+        count = 0
+        for doc in stream_chunks(iter_pdf_pages(path), metadata, splitter):
+            batch.append(doc)
+            count += 1
+            if len(batch) >= batch_size:
+                _worker_queue.put(("chunks", source, batch))
+                batch = []
+        if batch:
+            _worker_queue.put(("chunks", source, batch))
+        _worker_queue.put(("done", source, count))
+    except Exception as e:
+        _worker_queue.put(("error", source, str(e)))
+
+def load_manifest(manifest_path: Path) -> Dict[str, Dict[str, Any]]:
+    """Load the ingestion manifest: source path -> {hash, mtime, size, chunks}."""
+    if not manifest_path.exists():
+        return {}
+    with open(manifest_path, "r") as f:
+        return json.load(f)
+
+def save_manifest(manifest_path: Path, manifest: Dict[str, Dict[str, Any]]):
+    tmp_path = manifest_path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+def _plan_changes(pdf_files: List[Path], manifest: Dict[str, Dict[str, Any]], force: bool):
+    """
+    Compare the files on disk with the manifest.
+    Returns the files to (re)process with their content hash, and the sources that disappeared.
+    mtime and size are checked first so unchanged files are never re-hashed.
+    """
+    to_process: List[Tuple[Path, str]] = []
+    for pdf_file in pdf_files:
+        source = str(pdf_file)
+        stat = pdf_file.stat()
+        entry = manifest.get(source)
+        if not force and entry and entry["mtime"] == stat.st_mtime and entry["size"] == stat.st_size:
+            continue
+        content_hash = file_hash(pdf_file)
+        if not force and entry and entry["hash"] == content_hash:
+            entry["mtime"] = stat.st_mtime
+            continue
+        to_process.append((pdf_file, content_hash))
+    present = {str(pdf_file) for pdf_file in pdf_files}
+    removed = [source for source in manifest if source not in present]
+    return to_process, removed
+
+def ingest_pdfs(
+    pdf_dir: Optional[str] = None,
+    workers: Optional[int] = None,
+    batch_size: int = embed_batch_size,
+    force: bool = False
+) -> Dict[str, Any]:
+    """
+    Incrementally index the PDFs of a directory.
+    New or changed files are extracted and chunked in a process pool, chunks are streamed
+    into fixed-size embedding batches, chunks of deleted files are removed, the previous
+    version of a changed file is removed once all its new chunks are written,
+    and a manifest of content hashes and mtimes is kept next to the Chroma data.
     
-    print(f"Added {len(documents)} chunks to collection {collection_name}")
+    Args:
+        pdf_dir: Directory containing PDF files
+        workers: Number of extraction processes (defaults to the CPU count)
+        batch_size: Number of chunks embedded and written per batch
+        force: Re-process every file even if it did not change
+    
+    Returns:
+        Dictionary with ingestion statistics
+    """
+    started = time.perf_counter()
+    dir_path = Path(pdf_dir) if pdf_dir else pdf_dir_path
+    manifest_path = db_dir_path / manifest_file_name
+    manifest = load_manifest(manifest_path)
+    collection = get_collection()
+
+    pdf_files = sorted(dir_path.glob("*.pdf"))
+    to_process, removed = _plan_changes(pdf_files, manifest, force)
+    stats = {
+        "files_found": len(pdf_files),
+        "files_processed": 0,
+        "files_skipped": len(pdf_files) - len(to_process),
+        "files_removed": len(removed),
+        "chunks_added": 0,
+    }
+
+    for source in removed:
+        delete_source(source)
+        del manifest[source]
+
+    print(f"Found {len(pdf_files)} PDF files: {len(to_process)} new or changed, "
+          f"{stats['files_skipped']} unchanged, {len(removed)} removed")
+
+    buffer: List[Dict[str, Any]] = []
+    # Chunks not yet written per source; a manifest entry is committed once it drops to 0
+    pending: Dict[str, int] = {}
+    finished: Dict[str, Dict[str, Any]] = {}
+    hashes = {str(pdf_file): content_hash for pdf_file, content_hash in to_process}
+    previous_hashes: Dict[str, str] = {}
+
+    def commit_finished():
+        for source in [source for source in finished if pending.get(source) == 0]:
+            entry = finished.pop(source)
+            # Every chunk of the new version is written, so the previous version can go now
+            delete_stale_chunks(source, entry["hash"], entry["chunks"])
+            manifest[source] = entry
+            del pending[source]
+
+    def flush():
+        if not buffer:
+            return
+        add_to_collection(buffer)
+        for doc in buffer:
+            pending[doc["metadata"]["source"]] -= 1
+        stats["chunks_added"] += len(buffer)
+        buffer.clear()
+        commit_finished()
+        save_manifest(manifest_path, manifest)
+
+    if to_process:
+        # spawn avoids forking a process that may already hold torch / Chroma threads
+        context = multiprocessing.get_context("spawn")
+        workers = workers or os.cpu_count() or 1
+        # Bounded, so workers block instead of piling up chunks faster than they are embedded
+        chunk_queue = context.Queue(maxsize=2 * workers)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(chunk_queue,)) as executor:
+            futures = {
+                executor.submit(_extract_and_chunk, str(pdf_file), content_hash, dict(splitter_settings), batch_size): str(pdf_file)
+                for pdf_file, content_hash in to_process
+            }
+            # Sources that sent "done" or "error". A worker's queue feeder can still be flushing
+            # after its future resolved, so the loop waits for these messages, not for the futures
+            reported: Set[str] = set()
+
+            def fail(source: str, reason: Any):
+                reported.add(source)
+                print(f"[{len(reported)}/{len(to_process)}] Error processing {source}: {reason}")
+                # Drop the partial new version and keep the previous one; the file is retried on the next run
+                buffer[:] = [doc for doc in buffer if doc["metadata"]["source"] != source]
+                pending.pop(source, None)
+                if previous_hashes.get(source) != hashes[source]:
+                    delete_version_chunks(source, hashes[source])
+
+            while len(reported) < len(to_process):
+                try:
+                    kind, source, payload = chunk_queue.get(timeout=1)
+                except queue.Empty:
+                    # A worker process that died never reports its file
+                    for future, source in futures.items():
+                        if source not in reported and future.done() and future.exception() is not None:
+                            fail(source, future.exception())
+                    continue
+                if source in reported:
+                    # Late output of a worker already given up on
+                    continue
+
+                if kind == "start":
+                    # The previous version stays searchable and in the manifest until the new chunks are all written
+                    previous = manifest.get(source)
+                    if previous is not None:
+                        previous_hashes[source] = previous["hash"]
+                    pending[source] = 0
+                elif kind == "chunks":
+                    pending[source] += len(payload)
+                    buffer.extend(payload)
+                    if len(buffer) >= batch_size:
+                        flush()
+                elif kind == "done":
+                    reported.add(source)
+                    stat = Path(source).stat()
+                    finished[source] = {
+                        "hash": hashes[source],
+                        "mtime": stat.st_mtime,
+                        "size": stat.st_size,
+                        "chunks": payload,
+                    }
+                    stats["files_processed"] += 1
+                    print(f"[{len(reported)}/{len(to_process)}] {Path(source).name}: {payload} chunks")
+                    commit_finished()
+                elif kind == "error":
+                    fail(source, payload)
+    flush()
+    save_manifest(manifest_path, manifest)
+
+    elapsed = time.perf_counter() - started
+    stats["seconds"] = round(elapsed, 2)
+    stats["chunks_per_second"] = round(stats["chunks_added"] / elapsed, 2) if elapsed > 0 else 0.0
+    print(f"Processed {stats['files_processed']} files, {stats['chunks_added']} chunks in "
+          f"{stats['seconds']}s ({stats['chunks_per_second']} chunks/s)")
+    print(f"Total documents in collection: {collection.count()}")
+    return stats
 
 def process_pdf(pdf_path: Path):
     """Process a single PDF file."""
     print(f"Processing {pdf_path}")
-    text = extract_text_from_pdf(pdf_path)
-    if not text:
-        print(f"No text extracted from {pdf_path}")
-        return
-    
     metadata = {
         "filename": pdf_path.name,
-        "source": str(pdf_path)
+        "source": str(pdf_path),
+        "content_hash": file_hash(pdf_path)
     }
     
-    documents = chunk_text(text, metadata)
-    add_to_collection(documents)
-
-def process_all_pdfs(pdf_dir: str = None):
-    """Process all PDFs in the directory."""
-    dir_path = Path(pdf_dir) if pdf_dir else pdf_dir_path
-    pdf_files = list(dir_path.glob("*.pdf"))
-    if not pdf_files:
-        print(f"No PDF files found in {dir_path}")
-        return
-    
-    print(f"Found {len(pdf_files)} PDF files")
-    for pdf_file in pdf_files:
-        process_pdf(pdf_file)
+    count = 0
+    batch = []
+    complete = True
+    try:
+        for doc in stream_chunks(iter_pdf_pages(pdf_path), metadata):
+            batch.append(doc)
+            if len(batch) >= embed_batch_size:
+                add_to_collection(batch)
+                count += len(batch)
+                batch = []
+    except Exception as e:
+        complete = False
+        print(f"Error extracting text from {pdf_path}: {e}")
+    add_to_collection(batch)
+    count += len(batch)
     
-    print(f"Total documents in collection: {collection.count()}")
+    if not count:
+        print(f"No text extracted from {pdf_path}")
+        return
+    if complete:
+        # Older versions of the file are only removed once the new one is fully written
+        delete_stale_chunks(metadata["source"], metadata["content_hash"], count)
+    print(f"Added {count} chunks to collection {collection_name}")
+
+def process_all_pdfs(pdf_dir: str = None, workers: int = None, batch_size: int = embed_batch_size, force: bool = False):
+    """Process all new or changed PDFs in the directory."""
+    return ingest_pdfs(pdf_dir=pdf_dir, workers=workers, batch_size=batch_size, force=force)
 
 def get_embedding_function():
     """Get the current embedding function."""
@@ -170,7 +559,10 @@ def process_pdfs(
     db_dir: str = None, 
     collection_name: str = None,
     chunk_size: int = None, 
-    chunk_overlap: int = None
+    chunk_overlap: int = None,
+    workers: int = None,
+    batch_size: int = embed_batch_size,
+    force: bool = False
 ):
     """
     Process PDFs and add them to ChromaDB.
@@ -181,6 +573,9 @@ def process_pdfs(
         collection_name: Name of the collection
         chunk_size: Size of text chunks
         chunk_overlap: Overlap between chunks
+        workers: Number of extraction processes
+        batch_size: Number of chunks embedded per batch
+        force: Re-process every file even if it did not change
     """
     # Only initialize with new parameters if they are provided
     if any([pdf_dir, db_dir, collection_name, chunk_size, chunk_overlap]):
@@ -192,7 +587,37 @@ def process_pdfs(
             chunk_overlap=chunk_overlap or 200
         )
     
-    process_all_pdfs(pdf_dir=pdf_dir)
+    return process_all_pdfs(pdf_dir=pdf_dir, workers=workers, batch_size=batch_size, force=force)
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally index PDF files into ChromaDB.")
+    parser.add_argument("--pdf-dir", help="Directory containing PDF files (default: pdfs)")
+    parser.add_argument("--db-dir", help="Directory for ChromaDB storage (default: data/chromadb)")
+    parser.add_argument("--collection", help="Name of the collection (default: pdf_collection)")
+    parser.add_argument("--chunk-size", type=int, help="Size of text chunks (default: 1000)")
+    parser.add_argument("--chunk-overlap", type=int, help="Overlap between chunks (default: 200)")
+    parser.add_argument("--workers", type=int, help="Number of extraction processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=embed_batch_size, help="Chunks embedded per batch")
+    parser.add_argument("--force", action="store_true", help="Re-process every file even if unchanged")
+    parser.add_argument("--rebuild-lexical", action="store_true", help="Rebuild the BM25 index from the collection and exit")
+    args = parser.parse_args()
+
+    if args.rebuild_lexical:
+        if args.db_dir or args.collection:
+            initialize_pdf_processor(db_dir=args.db_dir or "data/chromadb", collection_name=args.collection or "pdf_collection")
+        rebuild_lexical_index()
+        return
+
+    process_pdfs(
+        pdf_dir=args.pdf_dir,
+        db_dir=args.db_dir,
+        collection_name=args.collection,
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        force=args.force
+    )
 
 if __name__ == "__main__":
-    process_pdfs()
\ No newline at end of file
+    main()
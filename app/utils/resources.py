@@ -0,0 +1,76 @@
+import asyncio
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+_warmup_functions: Dict[str, Callable[[], Any]] = {}
+
+# Readiness state reported by /healthz
+readiness: Dict[str, Any] = {"ready": False, "loaded": [], "failed": {}}
+
+
+def register_warmup(name: str, fn: Callable[[], Any]):
+    """Register a blocking function to run during the startup warm-up."""
+    _warmup_functions[name] = fn
+
+
+class LazyResource(Generic[T]):
+    """
+    Process-wide resource created on first use.
+    Creation is guarded by a lock so concurrent first calls build it only once.
+    """
+    def __init__(self, name: str, factory: Callable[[], T], warm_up: bool = True):
+        self.name = name
+        self._factory = factory
+        self._instance: Optional[T] = None
+        self._lock = threading.Lock()
+        if warm_up:
+            register_warmup(name, self.get)
+
+    @property
+    def loaded(self) -> bool:
+        return self._instance is not None
+
+    def get(self) -> T:
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = self._factory()
+        return self._instance
+
+
+_chroma_clients: Dict[str, Any] = {}
+_chroma_lock = threading.Lock()
+
+
+def get_chroma_client(path: str = "data/chromadb"):
+    """Return the shared Chroma PersistentClient for a storage path."""
+    key = str(Path(path).resolve())
+    if key not in _chroma_clients:
+        with _chroma_lock:
+            if key not in _chroma_clients:
+                import chromadb
+                _chroma_clients[key] = chromadb.PersistentClient(path=str(path))
+    return _chroma_clients[key]
+
+
+async def warm_up():
+    """
+    Run every registered warm-up function concurrently in worker threads and mark the
+    application ready once they are done. Failures are recorded; the resource will
+    simply be loaded again on first use.
+    """
+    names = list(_warmup_functions.keys())
+    results = await asyncio.gather(
+        *[asyncio.to_thread(_warmup_functions[name]) for name in names],
+        return_exceptions=True
+    )
+    for name, result in zip(names, results):
+        if isinstance(result, Exception):
+            print(f"Warm-up of {name} failed: {result}")
+            readiness["failed"][name] = str(result)
+        else:
+            readiness["loaded"].append(name)
+    readiness["ready"] = True
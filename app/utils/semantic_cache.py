@@ -0,0 +1,99 @@
+import os
+import time
+import threading
+from typing import Any, Dict, Hashable, List, Optional
+
+import numpy as np
+
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_CAPACITY = int(os.getenv("SEMANTIC_CACHE_CAPACITY", "1024"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))  # seconds
+
+
+class SemanticCache:
+    """
+    Cache of query results looked up by embedding similarity instead of exact text.
+    Embeddings live in one preallocated matrix, so a lookup is a single matrix-vector product.
+    The whole cache is dropped when the version of the underlying data changes.
+    """
+    def __init__(self, threshold: float = SEMANTIC_CACHE_THRESHOLD, capacity: int = SEMANTIC_CACHE_CAPACITY, ttl: float = SEMANTIC_CACHE_TTL):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.ndarray] = None
+        self._valid = np.zeros(capacity, dtype=bool)
+        self._expires = np.zeros(capacity, dtype=np.float64)
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._namespaces: List[Hashable] = [None] * capacity
+        self._results: List[Any] = [None] * capacity
+        self._version: Any = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _check_version(self, version: Any):
+        if version != self._version:
+            if self._version is not None:
+                self.invalidations += 1
+            self._valid[:] = False
+            self._results = [None] * self.capacity
+            self._version = version
+
+    def get(self, embedding, version: Any, namespace: Hashable = None) -> Optional[Any]:
+        """
+        Return the cached result of the most similar query if its cosine similarity reaches
+        the threshold, for the same namespace (e.g. top_k) and data version.
+        """
+        query = self._normalize(embedding)
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(version)
+            if self._matrix is None or not self._valid.any():
+                self.misses += 1
+                return None
+            similarities = self._matrix @ query
+            usable = self._valid & (self._expires > now) & np.array([ns == namespace for ns in self._namespaces])
+            similarities[~usable] = -np.inf
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+            self._last_used[best] = now
+            self.hits += 1
+            return self._results[best]
+
+    def put(self, embedding, result: Any, version: Any, namespace: Hashable = None):
+        vector = self._normalize(embedding)
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(version)
+            if self._matrix is None:
+                self._matrix = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+            # Reuse an expired or empty slot, otherwise evict the least recently used entry
+            free = np.flatnonzero(~self._valid | (self._expires <= now))
+            slot = int(free[0]) if free.size else int(np.argmin(self._last_used))
+            self._matrix[slot] = vector
+            self._valid[slot] = True
+            self._expires[slot] = now + self.ttl
+            self._last_used[slot] = now
+            self._namespaces[slot] = namespace
+            self._results[slot] = result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "entries": int(self._valid.sum()),
+                "capacity": self.capacity,
+            }
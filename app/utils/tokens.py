@@ -0,0 +1,51 @@
+import os
+from typing import Optional
+
+from app.utils.resources import register_warmup
+
+# Gemini's tokenizer is not public; cl100k_base is close enough to budget prompts with
+TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "cl100k_base")
+# Used when tiktoken or its encoding file is unavailable
+CHARS_PER_TOKEN = 4
+
+_encoding = None
+_encoding_failed = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+        except Exception as e:
+            # The encoding file is downloaded on first use, which fails on offline hosts
+            print(f"Token encoding {TOKEN_ENCODING} unavailable, estimating tokens from length: {e}")
+            _encoding_failed = True
+    return _encoding
+
+
+def count_tokens(text: Optional[str]) -> int:
+    """Approximate number of tokens of a text."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, marker: str = " …") -> str:
+    """Cut a text to at most max_tokens tokens, marker included, keeping its beginning."""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    budget = max(max_tokens - count_tokens(marker), 0)
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[:budget * CHARS_PER_TOKEN].rstrip() + marker
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:budget]).rstrip() + marker
+
+
+register_warmup("token_encoding", _get_encoding)
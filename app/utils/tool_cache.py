@@ -0,0 +1,249 @@
+import os
+import re
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+import functools
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+TOOL_CACHE_ENABLED = os.getenv("TOOL_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+TOOL_CACHE_CAPACITY = int(os.getenv("TOOL_CACHE_CAPACITY", "2048"))
+TOOL_CACHE_PERSISTENT = os.getenv("TOOL_CACHE_PERSISTENT", "false").lower() in ("1", "true", "yes")
+TOOL_CACHE_DB_PATH = Path(os.getenv("TOOL_CACHE_DB_PATH", "data/tool_cache.db"))
+
+
+class ToolCachePolicy:
+    """
+    How long results of one tool are kept and how its arguments are normalized.
+
+    Args:
+        ttl: Seconds a result stays valid, 0 disables caching for the tool
+        case_sensitive: Keep the case of string arguments (URLs); queries and city names are case-folded
+    """
+    def __init__(self, ttl: float, case_sensitive: bool = False):
+        self.ttl = ttl
+        self.case_sensitive = case_sensitive
+
+
+def _ttl(name: str, default: float) -> float:
+    return float(os.getenv(f"TOOL_CACHE_TTL_{name.upper()}", str(default)))
+
+
+DEFAULT_POLICIES: Dict[str, ToolCachePolicy] = {
+    "get_weather": ToolCachePolicy(_ttl("get_weather", 10 * 60)),
+    "ip_location": ToolCachePolicy(_ttl("ip_location", 60 * 60)),
+    "google_search": ToolCachePolicy(_ttl("google_search", 60 * 60)),
+    "fetch_web": ToolCachePolicy(_ttl("fetch_web", 6 * 60 * 60), case_sensitive=True),
+}
+
+
+def _normalize_value(value: Any, case_sensitive: bool) -> Any:
+    if isinstance(value, str):
+        value = re.sub(r"\s+", " ", unicodedata.normalize("NFC", value)).strip()
+        return value if case_sensitive else value.casefold()
+    if isinstance(value, dict):
+        return {str(k): _normalize_value(v, case_sensitive) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize_value(v, case_sensitive) for v in value]
+    return value
+
+
+class PersistentToolCache:
+    """SQLite tier shared across processes and restarts; values are stored as JSON."""
+    def __init__(self, path: Path):
+        os.makedirs(path.parent, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS tool_cache (
+                key TEXT PRIMARY KEY,
+                tool TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Tuple[float, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT expires_at, value FROM tool_cache WHERE key = ?", (key,)).fetchone()
+        if row is None or row[0] <= time.time():
+            return None
+        return row[0], json.loads(row[1])
+
+    def put(self, key: str, tool: str, value: Any, expires_at: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tool_cache (key, tool, value, expires_at) VALUES (?, ?, ?, ?)",
+                (key, tool, json.dumps(value, ensure_ascii=False), expires_at)
+            )
+            self._conn.commit()
+
+    def purge_expired(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM tool_cache WHERE expires_at <= ?", (time.time(),))
+            self._conn.commit()
+
+
+class ToolResultCache:
+    """
+    TTL cache for results of external tool calls, keyed by tool name and normalized arguments.
+    An in-memory LRU sits in front of an optional SQLite tier, and concurrent identical
+    calls share a single in-flight request. Only successful results are cached: a call
+    that raises is never stored.
+    """
+    def __init__(
+        self,
+        policies: Optional[Dict[str, ToolCachePolicy]] = None,
+        capacity: int = TOOL_CACHE_CAPACITY,
+        persistent: bool = TOOL_CACHE_PERSISTENT,
+        db_path: Path = TOOL_CACHE_DB_PATH,
+        enabled: bool = TOOL_CACHE_ENABLED
+    ):
+        self.policies = dict(DEFAULT_POLICIES if policies is None else policies)
+        self.capacity = capacity
+        self.enabled = enabled
+        self.db_path = db_path
+        self._persistent = persistent
+        self._store: Optional[PersistentToolCache] = None
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[str, int] = {}
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.shared_calls = 0
+
+    def register(self, tool: str, policy: ToolCachePolicy):
+        self.policies[tool] = policy
+
+    def key(self, tool: str, args: Any) -> str:
+        policy = self.policies.get(tool)
+        normalized = _normalize_value(args, policy.case_sensitive if policy else False)
+        payload = json.dumps([tool, normalized], sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _get_store(self) -> Optional[PersistentToolCache]:
+        if self._persistent and self._store is None:
+            self._store = PersistentToolCache(self.db_path)
+            self._store.purge_expired()
+        return self._store
+
+    def _get_memory(self, key: str) -> Optional[Tuple[float, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _put_memory(self, key: str, expires_at: float, value: Any):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    async def _load(self, tool: str, key: str, call: Callable[[], Awaitable[Any]], ttl: float) -> Any:
+        store = self._get_store()
+        if store is not None:
+            entry = await asyncio.to_thread(store.get, key)
+            if entry is not None:
+                self.persistent_hits += 1
+                self._put_memory(key, *entry)
+                return entry[1]
+
+        self.misses += 1
+        value = await call()
+        expires_at = time.time() + ttl
+        self._put_memory(key, expires_at, value)
+        if store is not None:
+            try:
+                await asyncio.to_thread(store.put, key, tool, value, expires_at)
+            except (TypeError, ValueError, sqlite3.Error) as e:
+                print(f"Error persisting {tool} result: {e}")
+        return value
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    async def get_or_call(self, tool: str, args: Any, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Return the cached result for (tool, args), or await call() and cache what it returns.
+
+        Args:
+            tool: Name of the cache policy to use
+            args: Arguments identifying the call; strings are normalized before hashing
+            call: Zero-argument coroutine function performing the real call
+        """
+        policy = self.policies.get(tool)
+        if not self.enabled or policy is None or policy.ttl <= 0:
+            return await call()
+
+        key = self.key(tool, args)
+        entry = self._get_memory(key)
+        if entry is not None:
+            self.hits += 1
+            return entry[1]
+
+        task = self._inflight.get(key)
+        if task is None or task.done():
+            task = asyncio.create_task(self._load(tool, key, call, policy.ttl))
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._finish, key))
+        else:
+            self.shared_calls += 1
+
+        # The shared call is only cancelled once every caller waiting on it has given up
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters.get(key) == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            self._waiters[key] -= 1
+            if self._waiters[key] == 0:
+                del self._waiters[key]
+
+    def cached(self, tool: str):
+        """Decorator caching an async function by its call arguments under the given policy."""
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                return await self.get_or_call(
+                    tool, {"args": list(args), "kwargs": kwargs}, lambda: func(*args, **kwargs)
+                )
+            return wrapper
+        return decorator
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.persistent_hits + self.misses
+        return {
+            "hits": self.hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.persistent_hits) / lookups, 4) if lookups else 0.0,
+            "shared_calls": self.shared_calls,
+            "in_flight": len(self._inflight),
+            "entries": len(self._entries),
+            "capacity": self.capacity,
+            "persistent": self._persistent,
+        }
+
+
+tool_cache = ToolResultCache()
@@ -1,6 +1,10 @@
 // Global state
 let currentSessionId = null;
 let sessions = [];
+// Cursors of the next page, from the X-Next-Cursor header
+let sessionsCursor = null;
+let messagesCursor = null;
+const userId = getUserId();
 
 // DOM Elements
 const chatForm = document.getElementById('chat-form');
@@ -27,6 +31,18 @@ document.addEventListener('DOMContentLoaded', () => {
     setupEventListeners();
 });
 
+// Stable id of this browser, used by the server to keep long-term memories per user.
+// It is not a credential: the server trusts whatever id a client sends.
+function getUserId() {
+    const key = 'chatbotUserId';
+    let id = localStorage.getItem(key);
+    if (!id) {
+        id = crypto.randomUUID();
+        localStorage.setItem(key, id);
+    }
+    return id;
+}
+
 // Set up event listeners
 function setupEventListeners() {
     // New session button
@@ -48,6 +64,7 @@ async function createNewSession() {
         
         // Reset current session ID
         currentSessionId = null;
+        messagesCursor = null;
         
         // Update UI to reflect new session
         updateActiveSession(null);
@@ -79,15 +96,16 @@ async function handleChatFormSubmit(e) {
     addTypingIndicator();
     
     try {
-        // Send message to API
-        const response = await fetch('/api/chat', {
+        // Send message to the streaming API
+        const response = await fetch('/api/chat/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
             },
             body: JSON.stringify({
                 message: message,
-                session_id: currentSessionId
+                session_id: currentSessionId,
+                user_id: userId
             })
         });
         
@@ -95,11 +113,45 @@ async function handleChatFormSubmit(e) {
             throw new Error(`API Error: ${response.status}`);
         }
         
-        const data = await response.json();
+        let isNewSession = false;
+        let assistantText = null;
+        
+        await readEventStream(response, async (event) => {
+            switch (event.type) {
+                case 'session':
+                    // Update session ID if this is a new session
+                    if (!currentSessionId) {
+                        currentSessionId = event.session_id;
+                        isNewSession = true;
+                    }
+                    break;
+                case 'tool_start':
+                    setTypingStatus(`Running ${event.name}...`);
+                    break;
+                case 'tool_end':
+                    setTypingStatus(`Finished ${event.name}`);
+                    break;
+                case 'token':
+                    if (!assistantText) {
+                        // First token: swap the typing indicator for the message bubble
+                        removeTypingIndicator();
+                        assistantText = addMessage('assistant', '');
+                    }
+                    assistantText.textContent += event.content;
+                    chatMessages.scrollTop = chatMessages.scrollHeight;
+                    break;
+                case 'done':
+                    if (!assistantText) {
+                        removeTypingIndicator();
+                        addMessage('assistant', event.response);
+                    }
+                    break;
+                case 'error':
+                    throw new Error(event.detail);
+            }
+        });
         
-        // Update session ID if this is a new session
-        if (!currentSessionId) {
-            currentSessionId = data.session_id;
+        if (isNewSession) {
             sessionActions.style.display = 'block';
             
             // Reload sessions to include the new one
@@ -112,9 +164,6 @@ async function handleChatFormSubmit(e) {
         // Remove typing indicator
         removeTypingIndicator();
         
-        // Add assistant response to UI
-        addMessage('assistant', data.response);
-        
         // Focus on input
         userInput.focus();
         
@@ -125,6 +174,36 @@ async function handleChatFormSubmit(e) {
     }
 }
 
+// Read a server-sent-event response and call onEvent for every parsed event
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        
+        buffer += decoder.decode(value, { stream: true });
+        
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            const data = rawEvent
+                .split('\n')
+                .filter(line => line.startsWith('data: '))
+                .map(line => line.slice(6))
+                .join('\n');
+            if (data) {
+                await onEvent(JSON.parse(data));
+            }
+        }
+    }
+}
+
 // Load all sessions
 async function loadSessions() {
     try {
@@ -135,6 +214,7 @@ async function loadSessions() {
         }
         
         sessions = await response.json();
+        sessionsCursor = response.headers.get('X-Next-Cursor');
         
         // Clear session list
         while (sessionList.firstChild) {
@@ -155,6 +235,7 @@ async function loadSessions() {
             sessions.forEach(session => {
                 addSessionToList(session);
             });
+            updateLoadMoreSessionsButton();
         }
         
     } catch (error) {
@@ -163,6 +244,47 @@ async function loadSessions() {
     }
 }
 
+// Load the next page of sessions
+async function loadMoreSessions() {
+    if (!sessionsCursor) return;
+    
+    try {
+        const response = await fetch(`/api/sessions?cursor=${encodeURIComponent(sessionsCursor)}`);
+        
+        if (!response.ok) {
+            throw new Error(`API Error: ${response.status}`);
+        }
+        
+        const page = await response.json();
+        sessionsCursor = response.headers.get('X-Next-Cursor');
+        sessions = sessions.concat(page);
+        page.forEach(session => {
+            addSessionToList(session);
+        });
+        updateLoadMoreSessionsButton();
+        
+    } catch (error) {
+        console.error('Error loading sessions:', error);
+        showErrorMessage('Failed to load more sessions. Please try again.');
+    }
+}
+
+// Keep the "load more" button at the end of the session list while there are more pages
+function updateLoadMoreSessionsButton() {
+    const existing = document.getElementById('load-more-sessions-btn');
+    if (existing) {
+        existing.remove();
+    }
+    if (!sessionsCursor) return;
+    
+    const button = document.createElement('button');
+    button.id = 'load-more-sessions-btn';
+    button.classList.add('load-more-btn');
+    button.textContent = 'Load more sessions';
+    button.addEventListener('click', loadMoreSessions);
+    sessionList.appendChild(button);
+}
+
 // Add a session to the list
 function addSessionToList(session) {
     // Clone the template
@@ -210,6 +332,7 @@ async function loadSession(sessionId) {
         }
         
         const messages = await response.json();
+        messagesCursor = response.headers.get('X-Next-Cursor');
         
         // Update current session ID
         currentSessionId = sessionId;
@@ -230,6 +353,7 @@ async function loadSession(sessionId) {
             messages.forEach(msg => {
                 addMessage(msg.role, msg.content);
             });
+            updateLoadOlderButton();
         }
         
     } catch (error) {
@@ -239,6 +363,55 @@ async function loadSession(sessionId) {
     }
 }
 
+// Load the page of messages before the oldest one shown
+async function loadOlderMessages() {
+    if (!currentSessionId || !messagesCursor) return;
+    const sessionId = currentSessionId;
+    
+    try {
+        const response = await fetch(`/api/sessions/${sessionId}?before=${encodeURIComponent(messagesCursor)}`);
+        
+        if (!response.ok) {
+            throw new Error(`API Error: ${response.status}`);
+        }
+        
+        const messages = await response.json();
+        // Another session was opened meanwhile
+        if (sessionId !== currentSessionId) return;
+        messagesCursor = response.headers.get('X-Next-Cursor');
+        
+        // Insert above the shown messages, keeping the view where it was
+        const previousHeight = chatMessages.scrollHeight;
+        const button = document.getElementById('load-older-btn');
+        const anchor = button ? button.nextSibling : chatMessages.firstChild;
+        messages.forEach(msg => {
+            chatMessages.insertBefore(createMessageElement(msg.role, msg.content), anchor);
+        });
+        updateLoadOlderButton();
+        chatMessages.scrollTop += chatMessages.scrollHeight - previousHeight;
+        
+    } catch (error) {
+        console.error('Error loading messages:', error);
+        showErrorMessage('Failed to load older messages. Please try again.');
+    }
+}
+
+// Keep the "load older" button above the messages while there are older pages
+function updateLoadOlderButton() {
+    const existing = document.getElementById('load-older-btn');
+    if (existing) {
+        existing.remove();
+    }
+    if (!messagesCursor) return;
+    
+    const button = document.createElement('button');
+    button.id = 'load-older-btn';
+    button.classList.add('load-more-btn');
+    button.textContent = 'Load older messages';
+    button.addEventListener('click', loadOlderMessages);
+    chatMessages.insertBefore(button, chatMessages.firstChild);
+}
+
 // Delete the current session
 async function deleteCurrentSession() {
     if (!currentSessionId) return;
@@ -248,7 +421,7 @@ async function deleteCurrentSession() {
     }
     
     try {
-        const response = await fetch(`/api/sessions/${currentSessionId}`, {
+        const response = await fetch(`/api/sessions/${currentSessionId}?user_id=${encodeURIComponent(userId)}`, {
             method: 'DELETE'
         });
         
@@ -284,8 +457,8 @@ function updateActiveSession(sessionId) {
     }
 }
 
-// Add a message to the UI
-function addMessage(role, content) {
+// Build a message element from the template
+function createMessageElement(role, content) {
     // Clone the template
     const messageElement = document.importNode(messageTemplate.content, true).querySelector('.message');
     
@@ -295,11 +468,22 @@ function addMessage(role, content) {
     // Set content
     messageElement.querySelector('p').textContent = content;
     
+    return messageElement;
+}
+
+// Add a message to the UI
+function addMessage(role, content) {
+    const messageElement = createMessageElement(role, content);
+    const textElement = messageElement.querySelector('p');
+    
     // Add to chat
     chatMessages.appendChild(messageElement);
     
     // Scroll to bottom
     chatMessages.scrollTop = chatMessages.scrollHeight;
+    
+    // Return the text element so streamed content can be appended to it
+    return textElement;
 }
 
 // Show typing indicator
@@ -318,6 +502,20 @@ function addTypingIndicator() {
     chatMessages.scrollTop = chatMessages.scrollHeight;
 }
 
+// Show tool progress next to the typing indicator
+function setTypingStatus(text) {
+    const indicator = document.getElementById('typing-indicator');
+    if (!indicator) return;
+    
+    let status = indicator.querySelector('.typing-status');
+    if (!status) {
+        status = document.createElement('span');
+        status.classList.add('typing-status');
+        indicator.appendChild(status);
+    }
+    status.textContent = text;
+}
+
 // Remove typing indicator
 function removeTypingIndicator() {
     const indicator = document.getElementById('typing-indicator');
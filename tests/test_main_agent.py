@@ -0,0 +1,63 @@
+import asyncio
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app.core import main_agent
+from app.core.budget import RequestBudget
+from app.schemas.memory import MemoryPlan
+
+
+def test_gather_context_degrades_when_a_branch_hangs(monkeypatch):
+    async def hanging_memory_branch(*args, **kwargs):
+        await asyncio.sleep(60)
+
+    async def tools_branch(*args, **kwargs):
+        return []
+
+    monkeypatch.setattr(main_agent, "_memory_branch", hanging_memory_branch)
+    monkeypatch.setattr(main_agent, "_tools_branch", tools_branch)
+    budget = RequestBudget(timeout=0.4, answer_reserve=0.2)
+
+    memories, tool_messages = asyncio.run(main_agent._gather_context("hello", [], budget))
+
+    assert memories == {}
+    assert tool_messages == []
+    assert budget.degraded == ["memory_branch"]
+
+
+def test_memory_branch_plans_once_and_stores_facts(monkeypatch):
+    plans = []
+    stored = []
+
+    async def plan(input_message, recent_chat_history, budget=None):
+        plans.append(input_message)
+        return MemoryPlan(query_user="name", store_user=["The user's name is Lan."], store_assistant=["The assistant is called Mai."])
+
+    async def allow(*args, **kwargs):
+        return True
+
+    async def add_many(facts, owner=None, session_id=None):
+        stored.append((facts, owner, session_id))
+
+    async def query_many(queries, owner=None):
+        return {"user": [["The user's name is Lan."]]}
+
+    monkeypatch.setattr(main_agent.memory_agent, "plan", plan)
+    monkeypatch.setattr(main_agent.memory_gate, "should_query", allow)
+    monkeypatch.setattr(main_agent.memory_gate, "should_store", allow)
+    monkeypatch.setattr(main_agent.memory.memory_store, "add_many", add_many)
+    monkeypatch.setattr(main_agent.memory.memory_store, "query_many", query_many)
+    history = [HumanMessage(content="Who are you?"), AIMessage(content="From now on, call me Mai.")]
+
+    async def run():
+        memories = await main_agent._memory_branch("My name is Lan.", history, RequestBudget(), "owner", "session")
+        await asyncio.gather(*main_agent._background_tasks)
+        return memories
+
+    memories = asyncio.run(run())
+
+    assert plans == ["My name is Lan."]
+    assert memories == {"user": ["The user's name is Lan."]}
+    assert stored == [(
+        {"user": ["The user's name is Lan."], "assistant": ["The assistant is called Mai."]}, "owner", "session"
+    )]
@@ -0,0 +1,30 @@
+import json
+
+from app.utils import pdf_process
+
+
+class _Collection:
+    def count(self):
+        return 0
+
+
+def test_failed_reingest_keeps_previous_manifest_entry(tmp_path, monkeypatch):
+    pdf_dir = tmp_path / "pdfs"
+    pdf_dir.mkdir()
+    broken = pdf_dir / "report.pdf"
+    broken.write_bytes(b"not a pdf")
+    source = str(broken)
+    previous = {"hash": "previous-version", "mtime": 0.0, "size": 1, "chunks": 3}
+    (tmp_path / pdf_process.manifest_file_name).write_text(json.dumps({source: previous}))
+
+    deleted_versions = []
+    monkeypatch.setattr(pdf_process, "db_dir_path", tmp_path)
+    monkeypatch.setattr(pdf_process, "get_collection", lambda: _Collection())
+    monkeypatch.setattr(pdf_process, "delete_version_chunks", lambda source, content_hash: deleted_versions.append(source))
+
+    stats = pdf_process.ingest_pdfs(str(pdf_dir), workers=1)
+
+    manifest = pdf_process.load_manifest(tmp_path / pdf_process.manifest_file_name)
+    assert manifest == {source: previous}
+    assert stats["files_processed"] == 0
+    assert deleted_versions == [source]
@@ -0,0 +1,34 @@
+import asyncio
+import hashlib
+
+import numpy as np
+from chromadb import EmbeddingFunction
+
+from app.core.memory.user_assisstant_memory import UserAssistantMemoryStore
+
+
+class _HashingEmbedding(EmbeddingFunction):
+    """Bag-of-words embedding, so the same wording always gets the same vector."""
+    def __init__(self):
+        pass
+
+    def __call__(self, input):
+        vectors = np.zeros((len(input), 64), dtype=np.float32)
+        for row, text in enumerate(input):
+            for word in text.lower().strip(".").split():
+                vectors[row, int(hashlib.md5(word.encode()).hexdigest(), 16) % 64] += 1.0
+        return vectors
+
+
+def test_fact_restated_in_two_sessions_survives_purging_one(tmp_path):
+    store = UserAssistantMemoryStore(path=str(tmp_path), embedding_function=_HashingEmbedding())
+
+    async def run():
+        await store.add_many({"user": ["The user likes green tea."]}, owner="owner", session_id="a")
+        await store.add_many({"user": ["The user likes green tea."]}, owner="owner", session_id="b")
+        await store.purge(owner="owner", session_id="a")
+        return await store.query_many({"user": ["green tea"]}, owner="owner")
+
+    results = asyncio.run(run())
+
+    assert results["user"] == [["The user likes green tea."]]